@@ -0,0 +1,256 @@
+"""
+Multi-worker mode under load at 1, 2, 4 and 8 workers: realtime delivery
+throughput, then connections end to end through the parent.
+
+The parent runs the cluster's Broker on top of fake_supabase and inserts
+messages between `--users` users; every user has one session, pinned to
+a worker the way the parent pins clients. Each worker routes the relayed
+events through its own RealtimeHub into a handler that does the per-event
+work of a session (MessageStore + SearchIndex update, plus `--work-us` of
+simulated render cost). Throughput is deliveries per second until every
+worker has handled all of its events; it scales with the number of cores.
+
+The second table opens `--clients` TCP connections to the parent's
+public socket, each from its own loopback address (127.0.0.x), and
+sends `--requests` lines over each, timing connect and round trips.
+The parent hands every accepted socket to the worker the client's IP is
+pinned to (cluster.accept_connections), and the worker echoes on it with
+its worker index (cluster.receive_connections). "direct" is one process
+accepting on its own socket, without a parent in front.
+
+    python benchmarks/cluster_load_bench.py [--messages 20000] [--work-us 200] [--clients 200]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from cluster import Broker, BrokerClient, accept_connections, handoff_pipes, receive_connections, start_workers, worker_for
+from fake_supabase import FakeSupabase
+
+WORKER_COUNTS = [1, 2, 4, 8]
+
+
+def _worker(index, user_ids, expected, work_us, results, conn):
+    # Imported here: this runs in a freshly spawned process.
+    from message_store import MessageStore
+    from realtime_hub import RealtimeHub
+    from search_index import SearchIndex
+
+    hub = RealtimeHub()
+    client = BrokerClient(conn)
+    hub.use_client(client)
+    handled = 0
+
+    def session(user_id):
+        store, index_ = MessageStore(), SearchIndex()
+
+        def on_message(row):
+            nonlocal handled
+            store.add([row])
+            index_.add([row])
+            deadline = time.perf_counter() + work_us / 1e6
+            while time.perf_counter() < deadline:
+                pass
+            handled += 1
+            if handled == expected:
+                results.put((index, time.perf_counter()))
+        return on_message
+
+    for user_id in user_ids:
+        hub.subscribe(client, user_id, None, session(user_id))
+    results.put((index, "ready"))
+    if not expected:
+        results.put((index, time.perf_counter()))
+    while True:
+        time.sleep(3600)
+
+
+def run(workers: int, messages: int, users: int, work_us: int) -> float:
+    backend = FakeSupabase()
+    user_ids = [backend.add_user(f"user{n}@example.com").id for n in range(users)]
+    placement = {user_id: worker_for(f"10.0.0.{n}", workers) for n, user_id in enumerate(user_ids)}
+    rows = [
+        {"sender_id": user_ids[n % users], "receiver_id": user_ids[(n * 7 + 1) % users], "content": f"message {n} lunch"}
+        for n in range(messages)
+    ]
+    expected = [0] * workers
+    for row in rows:
+        expected[placement[row["sender_id"]]] += 1
+        if row["receiver_id"] != row["sender_id"]:
+            expected[placement[row["receiver_id"]]] += 1
+
+    results = multiprocessing.get_context("spawn").Queue()
+    processes, conns = start_workers(
+        _worker,
+        workers,
+        lambda index: (index, [u for u in user_ids if placement[u] == index], expected[index], work_us, results),
+    )
+
+    async def drive():
+        loop = asyncio.get_running_loop()
+        broker = Broker(backend, loop)
+        for conn in conns:
+            broker.attach(conn)
+        ready, finished = 0, []
+        while ready < workers:
+            index, value = await loop.run_in_executor(None, results.get)
+            if value == "ready":
+                ready += 1
+            else:
+                finished.append(value)  # A worker with no users.
+        # Workers report ready once they have asked for their channels;
+        # events inserted before the broker has them all live would be lost.
+        while len(broker._topics) < users or any(t.status != "SUBSCRIBED" for t in broker._topics.values()):
+            await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        for offset in range(0, messages, 100):
+            await backend.table("messages").insert(rows[offset:offset + 100]).execute()
+            await asyncio.sleep(0)
+        while len(finished) < workers:
+            finished.append((await loop.run_in_executor(None, results.get))[1])
+        return max(finished) - start
+
+    try:
+        elapsed = asyncio.run(drive())
+    finally:
+        for process in processes:
+            process.terminate()
+    return sum(expected) / elapsed
+
+
+class EchoProtocol(asyncio.Protocol):
+    """Answers every line with the worker's index and the line."""
+
+    def __init__(self, index):
+        self.prefix = f"{index} ".encode()
+        self.buffer = b""
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b"\n")
+        for line in lines:
+            self.transport.write(self.prefix + line + b"\n")
+
+
+def _echo_worker(index, handles, listen_port, ready):
+    async def serve():
+        loop = asyncio.get_running_loop()
+        if handles is None:
+            server = await loop.create_server(lambda: EchoProtocol(index), "127.0.0.1", listen_port)
+            ready.put(index)
+            await server.serve_forever()
+        receive_connections(handles, loop, lambda: EchoProtocol(index))
+        ready.put(index)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+async def _client(n, port, requests, connects, round_trips, served_by):
+    address = f"127.0.0.{1 + n % 254}"
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, local_addr=(address, 0))
+    connects.append(time.perf_counter() - start)
+    for i in range(requests):
+        start = time.perf_counter()
+        writer.write(f"request {i}\n".encode())
+        line = await reader.readline()
+        round_trips.append(time.perf_counter() - start)
+    served_by[int(line.split()[0])] = served_by.get(int(line.split()[0]), 0) + 1
+    writer.close()
+
+
+def run_connections(workers, clients: int, requests: int):
+    """Connect and round-trip times through the parent's hand-off (`workers=None`: direct)."""
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    listener = socket.create_server(("127.0.0.1", 0), backlog=1024)
+    listener.setblocking(False)
+    port = listener.getsockname()[1]
+    if workers is None:
+        listener.close()
+        handles = []
+        processes = [context.Process(target=_echo_worker, args=(0, None, port, ready), daemon=True)]
+    else:
+        handles, worker_handles = handoff_pipes(workers)
+        processes = [
+            context.Process(target=_echo_worker, args=(index, worker_handles[index], None, ready), daemon=True)
+            for index in range(workers)
+        ]
+    for process in processes:
+        process.start()
+    if workers is not None:
+        for handle in worker_handles:
+            handle.close()
+    for _ in processes:
+        ready.get()
+
+    connects, round_trips, served_by = [], [], {}
+
+    async def drive():
+        accepting = None
+        if workers is not None:
+            accepting = asyncio.ensure_future(accept_connections(listener, handles, [p.pid for p in processes]))
+        start = time.perf_counter()
+        await asyncio.gather(*(_client(n, port, requests, connects, round_trips, served_by) for n in range(clients)))
+        elapsed = time.perf_counter() - start
+        if accepting is not None:
+            accepting.cancel()
+        return elapsed
+
+    try:
+        elapsed = asyncio.run(drive())
+    finally:
+        for process in processes:
+            process.terminate()
+        if workers is not None:
+            listener.close()
+    round_trips.sort()
+    return (
+        statistics.median(connects),
+        statistics.median(round_trips),
+        round_trips[int(len(round_trips) * 0.99) - 1],
+        len(round_trips) / elapsed,
+        [served_by.get(index, 0) for index in range(workers or 1)],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--work-us", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.messages} messages, {args.users} users, {args.work_us} us work per event")
+    print(f"{'workers':>8} {'deliveries/s':>14} {'speedup':>8}")
+    baseline = None
+    for workers in WORKER_COUNTS:
+        throughput = run(workers, args.messages, args.users, args.work_us)
+        baseline = baseline or throughput
+        print(f"{workers:>8} {throughput:>14,.0f} {throughput / baseline:>8.2f}")
+
+    print(f"\n{args.clients} connections through the parent, {args.requests} round trips each")
+    print(f"{'workers':>8} {'connect ms':>11} {'rtt p50 us':>11} {'rtt p99 us':>11} {'requests/s':>11}  connections per worker")
+    for workers in [None] + WORKER_COUNTS:
+        connect, p50, p99, rate, served = run_connections(workers, args.clients, args.requests)
+        print(
+            f"{workers or 'direct':>8} {connect * 1e3:>11.2f} {p50 * 1e6:>11.1f} {p99 * 1e6:>11.1f} "
+            f"{rate:>11,.0f}  {served}"
+        )
+
+
+if __name__ == "__main__":
+    main()
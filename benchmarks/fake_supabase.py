@@ -0,0 +1,565 @@
+"""
+In-memory stand-in for the parts of the Supabase client the app uses:
+
+    await table(...).select/insert/match/eq/or_/order/limit(...).execute()
+    await rpc(name, params).execute()
+    await auth.sign_in_with_password / sign_up / refresh_session / sign_out / get_user
+    realtime.channel(name).on_postgres_changes(event, callback, table=, schema=, filter=)
+    await channel.subscribe(status_cb)
+    await realtime.remove_channel(channel) (also as client.channel / remove_channel)
+
+Like supabase-py, it comes in two modes. The default mirrors the async
+client the app uses. `FakeSupabase(use_async=False)` mirrors the sync
+client: `execute()` and auth calls block, and realtime raises
+NotImplementedError just as the real sync client's does.
+
+Realtime callbacks receive postgres_changes payloads shaped like
+realtime-py's (`payload["data"]["record"]`), and sessions carry
+JWT-shaped, unsigned access tokens with `sub`, `email` and `exp` claims.
+
+`drop_connections()` simulates a realtime outage.
+
+Queries are evaluated in Python, including PostgREST `or`/`and` filter
+trees, and inserts are delivered to matching realtime bindings the way
+postgres_changes would. `latency` adds a fixed delay per request.
+`server_time` accumulates the time spent evaluating queries, so
+benchmarks can separate client-side cost from this fake's own cost.
+"""
+import asyncio
+import base64
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+# --- PostgREST filter evaluation ---
+
+def _coerce(row_value, value):
+    if isinstance(row_value, bool):
+        return value == "true"
+    if isinstance(row_value, int):
+        return int(value)
+    if isinstance(row_value, float):
+        return float(value)
+    return value
+
+
+def _like(pattern: str, flags=0):
+    regex = "".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern)
+    return re.compile(f"^{regex}$", flags | re.DOTALL)
+
+
+def _compare(row_value, op: str, value) -> bool:
+    if row_value is None:
+        return value == "null" if op in ("eq", "is") else False
+    if op in ("like", "ilike"):
+        return bool(_like(value, re.IGNORECASE if op == "ilike" else 0).match(str(row_value)))
+    if op == "in":
+        return row_value in {_coerce(row_value, v) for v in value}
+    value = _coerce(row_value, value)
+    return {
+        "eq": row_value == value,
+        "neq": row_value != value,
+        "lt": row_value < value,
+        "lte": row_value <= value,
+        "gt": row_value > value,
+        "gte": row_value >= value,
+    }[op]
+
+
+class _FilterParser:
+    """Parses `and(a.eq.1,or(b.lt."x",c.gt.2))`-style logical trees into predicates."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def parse_list(self):
+        items = [self.parse_item()]
+        while self.pos < len(self.text) and self.text[self.pos] == ",":
+            self.pos += 1
+            items.append(self.parse_item())
+        return items
+
+    def parse_item(self):
+        for logic in ("and(", "or("):
+            if self.text.startswith(logic, self.pos):
+                self.pos += len(logic)
+                children = self.parse_list()
+                self.pos += 1  # ')'
+                combine = all if logic == "and(" else any
+                return lambda row, children=children, combine=combine: combine(c(row) for c in children)
+        column = self._read_until(".")
+        self.pos += 1
+        op = self._read_until(".")
+        self.pos += 1
+        value = self._read_value()
+        return lambda row: _compare(row.get(column), op, value)
+
+    def _read_until(self, stop: str) -> str:
+        end = self.text.index(stop, self.pos)
+        token, self.pos = self.text[self.pos:end], end
+        return token
+
+    def _read_value(self) -> str:
+        if self.text[self.pos] == '"':
+            self.pos += 1
+            chars = []
+            while self.text[self.pos] != '"':
+                if self.text[self.pos] == "\\":
+                    self.pos += 1
+                chars.append(self.text[self.pos])
+                self.pos += 1
+            self.pos += 1
+            return "".join(chars)
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] not in ",)":
+            self.pos += 1
+        return self.text[start:self.pos]
+
+
+def parse_or(expression: str):
+    """Predicate for a PostgREST `or=(...)` filter body."""
+    children = _FilterParser(expression).parse_list()
+    return lambda row: any(c(row) for c in children)
+
+
+# --- Query builders ---
+
+class FakeQuery:
+    def __init__(self, backend, table: str):
+        self.backend = backend
+        self.table = table
+        self._columns = None
+        self._insert = None
+        self._upsert = None
+        self._filters = []
+        self._orders = []
+        self._limit = None
+
+    def select(self, columns: str = "*"):
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, rows):
+        self._insert = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id", ignore_duplicates: bool = False):
+        self._upsert = (
+            rows if isinstance(rows, list) else [rows],
+            [c.strip() for c in on_conflict.split(",")],
+            ignore_duplicates,
+        )
+        return self
+
+    def match(self, values: dict):
+        for column, value in values.items():
+            self.eq(column, value)
+        return self
+
+    def _filter(self, column, op, value):
+        self._filters.append(lambda row: _compare(row.get(column), op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "eq", str(value) if not isinstance(value, str) else value)
+
+    def neq(self, column, value):
+        return self._filter(column, "neq", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "lt", value)
+
+    def gt(self, column, value):
+        return self._filter(column, "gt", value)
+
+    def in_(self, column, values):
+        return self._filter(column, "in", [str(v) for v in values])
+
+    def ilike(self, column, pattern):
+        return self._filter(column, "ilike", pattern)
+
+    def or_(self, expression: str):
+        self._filters.append(parse_or(expression))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self._orders.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def execute(self):
+        return self.backend._execute(self)
+
+
+class AsyncFakeQuery(FakeQuery):
+    async def execute(self):
+        await self.backend._async_request()
+        return self.backend._apply(self)
+
+
+class FakeRpc:
+    def __init__(self, backend, name: str, params: dict):
+        self.backend = backend
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.backend._request()
+        return self._call()
+
+    def _call(self):
+        with self.backend._lock:
+            data = self.backend.functions[self.name](self.backend, **self.params)
+        return SimpleNamespace(data=data, error=None)
+
+
+class AsyncFakeRpc(FakeRpc):
+    async def execute(self):
+        await self.backend._async_request()
+        return self._call()
+
+
+# --- Auth and realtime ---
+
+def _segment(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+
+def fake_access_token(user, expires_in: int = 3600, now: float = None) -> str:
+    """An unsigned JWT-shaped access token for `user`."""
+    exp = int((now if now is not None else time.time()) + expires_in)
+    claims = {"sub": user.id, "email": user.email, "exp": exp, "role": "authenticated"}
+    return f"{_segment({'alg': 'HS256', 'typ': 'JWT'})}.{_segment(claims)}."
+
+
+class FakeAuth:
+    """The sync client's auth; AsyncFakeAuth awaits the same calls."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.current_user = None
+
+    def _user(self, email: str):
+        users = self.backend.users
+        if email not in users:
+            users[email] = SimpleNamespace(id=str(uuid.uuid4()), email=email)
+        return users[email]
+
+    def _session(self, user):
+        refresh_token = uuid.uuid4().hex
+        self.backend.refresh_tokens[refresh_token] = user
+        return SimpleNamespace(access_token=fake_access_token(user), refresh_token=refresh_token, expires_in=3600)
+
+    def _sign_up(self, credentials: dict):
+        self.current_user = self._user(credentials["email"].lower())
+        return SimpleNamespace(user=self.current_user, session=None)
+
+    def _sign_in_with_password(self, credentials: dict):
+        user = self.backend.users.get(credentials["email"].lower())
+        if user is None:
+            raise ValueError("Invalid login credentials")
+        self.current_user = user
+        return SimpleNamespace(user=user, session=self._session(user))
+
+    def _refresh_session(self, refresh_token: str = None):
+        user = self.backend.refresh_tokens.pop(refresh_token, None)
+        if user is None:
+            raise ValueError("Invalid Refresh Token")
+        self.current_user = user
+        return SimpleNamespace(user=user, session=self._session(user))
+
+    def _sign_out(self, options=None):
+        self.current_user = None
+
+    def _get_user(self):
+        return SimpleNamespace(user=self.current_user)
+
+    def sign_up(self, credentials: dict):
+        self.backend._request()
+        return self._sign_up(credentials)
+
+    def sign_in_with_password(self, credentials: dict):
+        self.backend._request()
+        return self._sign_in_with_password(credentials)
+
+    def refresh_session(self, refresh_token: str = None):
+        self.backend._request()
+        return self._refresh_session(refresh_token)
+
+    def sign_out(self, options=None):
+        self.backend._request()
+        return self._sign_out(options)
+
+    def get_user(self):
+        self.backend._request()
+        return self._get_user()
+
+
+class AsyncFakeAuth(FakeAuth):
+    async def sign_up(self, credentials: dict):
+        await self.backend._async_request()
+        return self._sign_up(credentials)
+
+    async def sign_in_with_password(self, credentials: dict):
+        await self.backend._async_request()
+        return self._sign_in_with_password(credentials)
+
+    async def refresh_session(self, refresh_token: str = None):
+        await self.backend._async_request()
+        return self._refresh_session(refresh_token)
+
+    async def sign_out(self, options=None):
+        await self.backend._async_request()
+        return self._sign_out(options)
+
+    async def get_user(self):
+        await self.backend._async_request()
+        return self._get_user()
+
+
+class FakeChannel:
+    def __init__(self, backend, name: str):
+        self.backend = backend
+        self.name = name
+        self.bindings = []
+        self.status_callback = None
+
+    def on_postgres_changes(self, event: str, callback, table: str = None, schema: str = None, filter: str = None):
+        column, _, value = (filter or "").partition("=eq.")
+        self.bindings.append((event, table, column, value, callback))
+        return self
+
+    async def subscribe(self, callback=None):
+        self.status_callback = callback
+        with self.backend._lock:
+            self.backend.channels.append(self)
+        if callback is not None:
+            callback("SUBSCRIBED", None)
+        return self
+
+
+class FakeRealtime:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def channel(self, name: str):
+        return FakeChannel(self.backend, name)
+
+    async def remove_channel(self, channel):
+        with self.backend._lock:
+            if channel in self.backend.channels:
+                self.backend.channels.remove(channel)
+
+
+class SyncFakeRealtime:
+    """Realtime on the sync client: every call fails, as in supabase-py."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _unavailable(self, *args, **kwargs):
+        raise NotImplementedError(
+            "This feature isn't available in the sync client. "
+            "You can use the realtime feature in the async client only."
+        )
+
+    channel = remove_channel = _unavailable
+
+
+# --- Backend ---
+
+def _get_uuid_from_email(backend, email_to_find):
+    user = backend.users.get(email_to_find.lower())
+    return user.id if user else None
+
+
+def _get_uuids_from_emails(backend, emails_to_find):
+    return [
+        {"email": email, "id": backend.users[email].id}
+        for email in emails_to_find
+        if email in backend.users
+    ]
+
+
+def _inbox_summaries(backend):
+    me = backend.auth.current_user.id
+    reads = {
+        row["peer_id"]: row["last_read_at"]
+        for row in backend.tables.get("conversation_reads", [])
+        if row["user_id"] == me
+    }
+    summaries = {}
+    for row in backend.tables.get("messages", []):
+        if me not in (row["sender_id"], row["receiver_id"]):
+            continue
+        peer = row["receiver_id"] if row["sender_id"] == me else row["sender_id"]
+        summary = summaries.setdefault(peer, {"peer_id": peer, "last_created_at": "", "unread_count": 0})
+        if (row["created_at"], row["id"]) > (summary["last_created_at"], summary.get("id", "")):
+            summary.update(
+                id=row["id"],
+                last_sender_id=row["sender_id"],
+                last_content=row["content"],
+                last_created_at=row["created_at"],
+            )
+        if row["receiver_id"] == me and row["created_at"] > reads.get(peer, ""):
+            summary["unread_count"] += 1
+    return [{k: v for k, v in summary.items() if k != "id"} for summary in summaries.values()]
+
+
+class FakeSupabase:
+    """A single in-memory Supabase project shared by any number of clients."""
+
+    def __init__(self, latency: float = 0.0, use_async: bool = True):
+        self.latency = latency
+        self.use_async = use_async
+        self.tables = {}
+        self.users = {}
+        self.channels = []
+        self.refresh_tokens = {}
+        self.functions = {
+            "get_uuid_from_email": _get_uuid_from_email,
+            "get_uuids_from_emails": _get_uuids_from_emails,
+            "inbox_summaries": _inbox_summaries,
+        }
+        self.requests = 0
+        self.server_time = 0.0
+        self.auth = AsyncFakeAuth(self) if use_async else FakeAuth(self)
+        self.realtime = FakeRealtime(self) if use_async else SyncFakeRealtime(self)
+        self._lock = threading.RLock()
+        self._clock = itertools.count()
+
+    # Client surface
+
+    def table(self, name: str) -> FakeQuery:
+        return (AsyncFakeQuery if self.use_async else FakeQuery)(self, name)
+
+    def rpc(self, name: str, params: dict = None) -> FakeRpc:
+        return (AsyncFakeRpc if self.use_async else FakeRpc)(self, name, params or {})
+
+    def channel(self, name: str):
+        return self.realtime.channel(name)
+
+    async def remove_channel(self, channel):
+        await self.realtime.remove_channel(channel)
+
+    # Test helpers
+
+    def add_user(self, email: str):
+        return self.auth._user(email.lower())
+
+    def next_timestamp(self) -> str:
+        """Strictly increasing created_at values, like now() on a busy table."""
+        return (_EPOCH + timedelta(microseconds=next(self._clock))).isoformat()
+
+    def drop_connections(self, status: str = "CHANNEL_ERROR"):
+        """Simulates a realtime outage: every channel stops receiving and reports `status`."""
+        with self._lock:
+            channels, self.channels = self.channels, []
+        for channel in channels:
+            if channel.status_callback is not None:
+                channel.status_callback(status, None)
+
+    def seed(self, table: str, rows):
+        """Bulk-loads rows (with defaults filled in) without realtime delivery."""
+        with self._lock:
+            self.tables.setdefault(table, []).extend(self._with_defaults(row) for row in rows)
+
+    # Internals
+
+    def _request(self):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    async def _async_request(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _with_defaults(self, row: dict) -> dict:
+        row = dict(row)
+        row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", self.next_timestamp())
+        return row
+
+    def _execute(self, query: FakeQuery):
+        self._request()
+        return self._apply(query)
+
+    def _apply(self, query: FakeQuery):
+        start = time.perf_counter()
+        with self._lock:
+            rows = self.tables.setdefault(query.table, [])
+            if query._insert is not None:
+                data = [self._with_defaults(row) for row in query._insert]
+                rows.extend(data)
+            elif query._upsert is not None:
+                data, inserted = self._upsert(rows, *query._upsert)
+            else:
+                data = self._select(rows, query)
+        self.server_time += time.perf_counter() - start
+
+        if query._insert is not None:
+            self._notify(query.table, data)
+        elif query._upsert is not None:
+            self._notify(query.table, inserted)
+        return SimpleNamespace(data=[dict(row) for row in data], error=None)
+
+    def _upsert(self, rows, new_rows, keys, ignore_duplicates):
+        data, inserted = [], []
+        for new_row in new_rows:
+            existing = next((r for r in rows if all(r.get(k) == new_row.get(k) for k in keys)), None)
+            if existing is not None:
+                if not ignore_duplicates:
+                    existing.update(new_row)
+                    data.append(existing)
+            else:
+                row = self._with_defaults(new_row)
+                rows.append(row)
+                data.append(row)
+                inserted.append(row)
+        return data, inserted
+
+    def _select(self, rows, query: FakeQuery):
+        data = [row for row in rows if all(f(row) for f in query._filters)]
+        for column, desc in reversed(query._orders):
+            data.sort(key=lambda row: row.get(column), reverse=desc)
+        if query._limit is not None:
+            data = data[:query._limit]
+        if query._columns is not None:
+            data = [{c: row.get(c) for c in query._columns} for row in data]
+        return data
+
+    def _notify(self, table: str, rows):
+        with self._lock:
+            bindings = [b for channel in self.channels for b in channel.bindings]
+        for row in rows:
+            for event, bound_table, column, value, callback in bindings:
+                if event not in ("INSERT", "*") or bound_table != table:
+                    continue
+                if column and str(row.get(column)) != value:
+                    continue
+                callback({
+                    "data": {
+                        "schema": "public",
+                        "table": table,
+                        "commit_timestamp": row.get("created_at"),
+                        "type": "INSERT",
+                        "errors": None,
+                        "columns": [],
+                        "record": dict(row),
+                    },
+                    "ids": [],
+                })
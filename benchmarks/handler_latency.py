@@ -0,0 +1,129 @@
+"""
+Handler latency under concurrent sessions: sync vs. async Supabase client.
+
+A local keep-alive HTTP server stands in for PostgREST with PostgREST-like
+latency (mostly fast, occasionally slow). Every simulated session gets its
+own client and fires a burst of the app's real data handlers against it:
+`Inbox.load`, `Inbox.mark_read` and `ContactDirectory.resolve_many`.
+
+* sync:  create_client(); db.execute() runs each blocking call in the
+         loop's default thread pool, so slow calls hold pool workers.
+* async: clients.ClientFactory.create(), the app's path; db.execute()
+         awaits the async query builders on the loop.
+
+    python benchmarks/handler_latency.py [--sessions 10 50 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from supabase import ClientOptions, create_client
+
+from clients import ClientFactory
+from contacts import ContactDirectory
+from inbox import ConversationSummary, Inbox
+from pool_bench import API_KEY
+
+EVENTS_PER_SESSION = 5
+FAST, SLOW, SLOW_RATIO = 0.010, 0.150, 0.05
+
+
+class PostgrestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    rng = random.Random(42)
+    lock = threading.Lock()
+
+    def respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        with PostgrestHandler.lock:
+            slow = PostgrestHandler.rng.random() < SLOW_RATIO
+        time.sleep(SLOW if slow else FAST)
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = respond
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run_session(n, client, results):
+    user_id = f"user-{n}"
+    inbox = Inbox(user_id)
+    directory = ContactDirectory()
+    # mark_read only calls the server for a conversation with messages.
+    inbox._summaries["peer"] = ConversationSummary("peer", user_id, "hi", "2024-01-01T00:00:00Z", 1)
+    handlers = [
+        lambda event: inbox.load(client),
+        lambda event: inbox.mark_read(client, "peer"),
+        lambda event: directory.resolve_many(client, [f"contact-{event}@example.com"]),
+    ]
+
+    async def fire(handler, event, fired_at):
+        await handler(event)
+        results.append(time.perf_counter() - fired_at)
+
+    await asyncio.gather(
+        *(fire(handlers[event % len(handlers)], event, time.perf_counter()) for event in range(EVENTS_PER_SESSION))
+    )
+
+
+async def bench(clients):
+    results = []
+    await asyncio.gather(*(run_session(n, client, results) for n, client in enumerate(clients)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10, 50, 200])
+    args = parser.parse_args()
+
+    server = Server(("127.0.0.1", 0), PostgrestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    factory = ClientFactory(url, API_KEY)
+
+    async def run_all():
+        print(f"{'sessions':>8} | {'sync p50':>9} {'p99':>8} | {'async p50':>10} {'p99':>8}  (ms)")
+        for sessions in args.sessions:
+            options = ClientOptions(auto_refresh_token=False)
+            sync_clients = [create_client(url, API_KEY, options=options) for _ in range(sessions)]
+            sync = await bench(sync_clients)
+            async_clients = [await factory.create() for _ in range(sessions)]
+            non_blocking = await bench(async_clients)
+            print(
+                f"{sessions:>8} | {statistics.median(sync) * 1e3:>9.1f} {percentile(sync, 99) * 1e3:>8.1f} | "
+                f"{statistics.median(non_blocking) * 1e3:>10.1f} {percentile(non_blocking, 99) * 1e3:>8.1f}"
+            )
+
+    asyncio.run(run_all())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
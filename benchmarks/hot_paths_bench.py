@@ -0,0 +1,364 @@
+"""
+Offline benchmark suite for the chat hot paths, run against fake_supabase.
+
+* load_messages     newest page + one older page at several history sizes
+* send -> receive   insert to realtime callback through RealtimeHub, with
+                    more and more unrelated sessions connected
+* reconnect         gap fill after a realtime drop, at several history sizes
+* render            MessageListRenderer reset + per-message append cost
+* load_contacts     batched contact resolution plus the inbox summaries,
+                    cold and warm
+* chat_view         the real chat view on a stub page: opening a chat
+                    (load_contacts, load_messages, render_message) and
+                    send_message -> on_new_message -> apply_incoming
+                    between two sessions, timed by the metrics registry
+
+Times are wall-clock per operation. "server" is the time the fake spends
+evaluating queries itself; "client" is what is left over, i.e. our code.
+
+    python benchmarks/hot_paths_bench.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import flet as ft
+
+import metrics
+from chat import chat_view
+from contacts import ContactDirectory, directory
+from fake_supabase import FakeSupabase
+from history import cursor, fetch_page, fetch_since
+from inbox import Inbox
+from message_view import MessageListRenderer
+from realtime_hub import RealtimeHub, hub
+from view_cache import view_cache_for
+
+HISTORY_SIZES = [1_000, 10_000, 50_000]
+SESSION_COUNTS = [1, 10, 100]
+CONTACT_COUNTS = [10, 200]
+ROUND_TRIPS = 200
+
+
+def seed_conversation(backend, size, noise_ratio=1):
+    """`size` messages between two users, plus unrelated traffic."""
+    me = backend.add_user("me@example.com").id
+    peer = backend.add_user("peer@example.com").id
+    other = backend.add_user("other@example.com").id
+    rows = []
+    for i in range(size * (1 + noise_ratio)):
+        if i % (1 + noise_ratio):
+            rows.append({"sender_id": other, "receiver_id": peer, "content": f"noise {i}"})
+        else:
+            sender, receiver = (me, peer) if i % 2 else (peer, me)
+            rows.append({"sender_id": sender, "receiver_id": receiver, "content": f"message {i}"})
+    backend.seed("messages", rows)
+    return me, peer
+
+
+def bench_load_messages():
+    print("\nload_messages (newest page + one older page)")
+    print(f"{'history':>8} {'total ms':>10} {'server ms':>10} {'client ms':>10}")
+    for size in HISTORY_SIZES:
+        backend = FakeSupabase()
+        me, peer = seed_conversation(backend, size)
+
+        async def load():
+            newest = await fetch_page(backend, me, peer)
+            await fetch_page(backend, me, peer, before=cursor(newest[0]))
+
+        backend.server_time = 0.0
+        start = time.perf_counter()
+        asyncio.run(load())
+        total = time.perf_counter() - start
+        print(
+            f"{size:>8} {total * 1e3:>10.2f} {backend.server_time * 1e3:>10.2f} "
+            f"{(total - backend.server_time) * 1e3:>10.2f}"
+        )
+
+
+async def round_trip(sessions):
+    """Insert -> listener latency with `sessions` conversations subscribed."""
+    backend = FakeSupabase()
+    hub = RealtimeHub()
+    pairs = []
+    for n in range(sessions):
+        a = backend.add_user(f"a{n}@example.com").id
+        b = backend.add_user(f"b{n}@example.com").id
+        pairs.append((a, b))
+
+    delivered = {}
+    received_at = []
+
+    def listener(row, n=None):
+        delivered[n] = delivered.get(n, 0) + 1
+        if n == 0:
+            received_at.append(time.perf_counter())
+
+    for n, (a, b) in enumerate(pairs):
+        hub.subscribe(backend, a, b, lambda row, n=n: listener(row, n))
+    await asyncio.sleep(0)  # Let the channels subscribe.
+
+    latencies = []
+    me, peer = pairs[0]
+    for i in range(ROUND_TRIPS):
+        sent_at = time.perf_counter()
+        await backend.table("messages").insert({"sender_id": me, "receiver_id": peer, "content": f"hi {i}"}).execute()
+        latencies.append(received_at[-1] - sent_at)
+
+    latencies.sort()
+    return latencies, sum(delivered.values())
+
+
+def bench_round_trip():
+    print("\nsend_message -> on_new_message round trip")
+    print(f"{'sessions':>8} {'p50 us':>10} {'p99 us':>10} {'delivered':>10}")
+    for sessions in SESSION_COUNTS:
+        latencies, delivered = asyncio.run(round_trip(sessions))
+        print(
+            f"{sessions:>8} {statistics.median(latencies) * 1e6:>10.1f} "
+            f"{latencies[int(len(latencies) * 0.99) - 1] * 1e6:>10.1f} {delivered:>10}"
+        )
+
+
+def bench_reconnect(outage=20):
+    print(f"\nreconnect gap fill ({outage} messages sent during the outage)")
+    print(f"{'history':>8} {'client ms':>10} {'rows':>6} {'resyncs':>8}")
+    for size in HISTORY_SIZES:
+        backend = FakeSupabase()
+        me, peer = seed_conversation(backend, size)
+        hub = RealtimeHub(backoff_base=0.01)
+        resyncs = []
+
+        async def reconnect():
+            hub.subscribe(backend, me, peer, lambda row: None, on_resync=resyncs.append)
+            await asyncio.sleep(0)
+            await backend.table("messages").insert({"sender_id": peer, "receiver_id": me, "content": "before"}).execute()
+
+            backend.drop_connections()
+            backend.seed("messages", [
+                {"sender_id": peer, "receiver_id": me, "content": f"missed {i}"} for i in range(outage)
+            ])
+            while not resyncs:
+                await asyncio.sleep(0.005)
+
+            backend.server_time = 0.0
+            start = time.perf_counter()
+            rows = await fetch_since(backend, me, peer, after=resyncs[0])
+            return rows, time.perf_counter() - start
+
+        rows, total = asyncio.run(reconnect())
+        print(f"{size:>8} {(total - backend.server_time) * 1e3:>10.2f} {len(rows):>6} {len(resyncs):>8}")
+
+
+def render_message(msg, control=None):
+    text = f"{'You' if msg['sender_id'] == 'me' else 'Them'}: {msg['content']}"
+    if control is None:
+        return ft.Text(text)
+    control.value = text
+    return control
+
+
+def bench_render():
+    print("\nupdate_message_list (reset) and per-message append")
+    print(f"{'history':>8} {'reset ms':>10} {'append us':>10} {'mounted':>8}")
+    for size in HISTORY_SIZES:
+        rows = [
+            {"id": i, "sender_id": "me" if i % 2 else "peer", "content": f"message {i}", "created_at": str(i)}
+            for i in range(size + ROUND_TRIPS)
+        ]
+        list_view = ft.ListView()
+        renderer = MessageListRenderer(list_view, render_message)
+
+        start = time.perf_counter()
+        renderer.reset(rows[:size])
+        reset = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for row in rows[size:]:
+            renderer.append(row)
+        append = (time.perf_counter() - start) / ROUND_TRIPS
+        print(f"{size:>8} {reset * 1e3:>10.2f} {append * 1e6:>10.1f} {len(list_view.controls):>8}")
+
+
+def bench_load_contacts():
+    print("\nload_contacts (batched resolution + inbox summaries)")
+    print(f"{'contacts':>8} {'cold ms':>10} {'warm ms':>10} {'round trips':>12}")
+    for count in CONTACT_COUNTS:
+        backend = FakeSupabase(latency=0.005)
+        me = backend.add_user("me@example.com")
+        backend.auth.current_user = me
+        contacts = [backend.add_user(f"contact{n}@example.com") for n in range(count)]
+        backend.seed("messages", [
+            {"sender_id": contact.id, "receiver_id": me.id, "content": f"hello {n}"}
+            for n, contact in enumerate(contacts)
+        ])
+        emails = [contact.email for contact in contacts]
+        directory = ContactDirectory()
+        inbox = Inbox(me.id)
+
+        async def load():
+            await asyncio.gather(directory.resolve_many(backend, emails), inbox.load(backend))
+
+        start = time.perf_counter()
+        asyncio.run(load())
+        cold = time.perf_counter() - start
+        cold_requests = backend.requests
+
+        start = time.perf_counter()
+        asyncio.run(directory.resolve_many(backend, emails))
+        warm = time.perf_counter() - start
+        print(f"{count:>8} {cold * 1e3:>10.2f} {warm * 1e3:>10.2f} {cold_requests:>5} + {backend.requests - cold_requests}")
+
+
+class Session:
+    def __init__(self):
+        self._values = {}
+
+    def get(self, key):
+        return self._values.get(key)
+
+    def set(self, key, value):
+        self._values[key] = value
+
+
+class StubPage:
+    """The parts of ft.Page that chat_view uses; updates are counted, not sent."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.session = Session()
+        self.web = False
+        self.overlay = []
+        self.views = []
+        self.end_drawer = SimpleNamespace(open=False)
+        self.snack_bar = None
+        self.updates = 0
+        self._tasks = []
+
+    def run_task(self, handler, *args):
+        future = asyncio.run_coroutine_threadsafe(handler(*args), self.loop)
+        self._tasks.append(future)
+        return future
+
+    async def settle(self):
+        """Waits for every task started so far, including ones they start."""
+        while self._tasks:
+            tasks, self._tasks = self._tasks, []
+            await asyncio.gather(*(asyncio.wrap_future(task) for task in tasks), return_exceptions=True)
+        # Let trailing render flushes run.
+        await asyncio.sleep(0.05)
+
+    def update(self, *controls):
+        self.updates += 1
+
+    def open(self, control):
+        pass
+
+    def go(self, route):
+        pass
+
+    def launch_url(self, url):
+        pass
+
+
+OPERATIONS = [
+    "chat.load_contacts",
+    "chat.start_chat_with_contact",
+    "chat.load_messages",
+    "chat.send_message",
+    "chat.on_new_message",
+    "chat.apply_incoming",
+]
+
+
+def operation_totals() -> dict:
+    operations = metrics.registry.snapshot()["operations"]
+    return {name: (op["count"], op["latency_seconds"]["sum"]) for name, op in operations.items()}
+
+
+async def drive_chat_view(history, contact_count):
+    hub.use_loop(asyncio.get_running_loop())
+    backend = FakeSupabase()
+    me, peer = seed_conversation(backend, history)
+    me_user = backend.users["me@example.com"]
+    backend.auth.current_user = me_user
+    contacts = ["peer@example.com"] + [backend.add_user(f"contact{n}@example.com").email for n in range(contact_count - 1)]
+    backend.seed("contacts", [{"user_id": me, "contact_email": email} for email in contacts])
+    backend.seed("contacts", [{"user_id": peer, "contact_email": "me@example.com"}])
+    # The process-wide directory may hold ids from an earlier run's backend.
+    for email in contacts + ["me@example.com"]:
+        directory.invalidate(email)
+
+    pages = {}
+    views = {}
+    for user_id in (me, peer):
+        pages[user_id] = StubPage(asyncio.get_running_loop())
+        views[user_id] = chat_view(pages[user_id], backend, user_id)
+        await pages[user_id].settle()
+
+    # Open the conversation on both sides, the way a click on a contact does.
+    for user_id, email in ((me, "peer@example.com"), (peer, "me@example.com")):
+        contacts_list_view = views[user_id].end_drawer.controls[-1]
+        tile = next(tile for tile in contacts_list_view.controls if tile.data == email)
+        tile.on_click(None)
+        await pages[user_id].settle()
+
+    input_message = views[me].controls[0].controls[-1].controls[1]
+    peer_messages = views[peer].controls[0].controls[1]
+    latencies = []
+    for i in range(ROUND_TRIPS):
+        content = f"round trip {i}"
+        input_message.value = content
+        sent_at = time.perf_counter()
+        await input_message.on_submit(None)
+        while not peer_messages.controls[-1].value.endswith(content):
+            await asyncio.sleep(0)
+        latencies.append(time.perf_counter() - sent_at)
+
+    for user_id in (me, peer):
+        await pages[user_id].settle()
+        view_cache_for(pages[user_id]).invalidate()
+    latencies.sort()
+    return latencies
+
+
+def bench_chat_view(contact_count=50):
+    print(f"\nchat_view on a stub page ({contact_count} contacts, {ROUND_TRIPS} messages sent)")
+    os.environ["CHAT_CACHE_DIR"] = tempfile.mkdtemp(prefix="hot_paths_bench_")
+    enabled, metrics.registry.enabled = metrics.registry.enabled, True
+    try:
+        for size in HISTORY_SIZES[:2]:
+            before = operation_totals()
+            latencies = asyncio.run(drive_chat_view(size, contact_count))
+            after = operation_totals()
+            # Back-to-back sends wait for the render scheduler's next frame (FRAME_INTERVAL).
+            print(f"history {size}: send -> peer's list p50 {statistics.median(latencies) * 1e3:.2f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1e3:.2f} ms")
+            print(f"  {'operation':<30} {'calls':>6} {'mean ms':>9}")
+            for name in OPERATIONS:
+                count, total = after.get(name, (0, 0.0))
+                count -= before.get(name, (0, 0.0))[0]
+                total -= before.get(name, (0, 0.0))[1]
+                print(f"  {name:<30} {count:>6} {total / max(1, count) * 1e3:>9.3f}")
+    finally:
+        metrics.registry.enabled = enabled
+
+
+def main():
+    bench_load_messages()
+    bench_round_trip()
+    bench_reconnect()
+    bench_render()
+    bench_load_contacts()
+    bench_chat_view()
+
+
+if __name__ == "__main__":
+    main()
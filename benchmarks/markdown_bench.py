@@ -0,0 +1,126 @@
+"""
+Render cost of a 5k-message history with Markdown, with and without the
+session's Markdown cache.
+
+Renders every message into a control the way chat.render_message does,
+once cold and then again for each rebuild (reloads, search results), in
+three modes:
+
+  parse always   every message goes through the Markdown parser
+  fast path      plain-text messages skip the parser (markdown_body)
+  cached         fast path plus a session cache (markdown_cache), so a
+                 rebuild reuses the bodies parsed by the first render
+
+"prepare" times the body preparation alone; "rebuild" also builds the
+Flet controls.
+
+    python benchmarks/markdown_bench.py [--messages 5000] [--rebuilds 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import flet as ft
+
+from rich_text import looks_plain, markdown_body, markdown_cache, parse
+
+USER_ID = "me"
+MARKDOWN_SAMPLES = [
+    "**heads up**: the build for {n} is green",
+    "see [the docs](https://example.com/docs/{n}) and _this_ one",
+    "```python\ndef handler_{n}(event):\n    return event['new']\n```\nthat's the fix",
+    "- milk\n- eggs {n}\n- `coffee`",
+    "> quoting message {n}\nagreed",
+]
+
+
+def make_rows(count: int, markdown_share: float = 0.3):
+    rng = random.Random(1)
+    rows = []
+    for n in range(count):
+        if rng.random() < markdown_share:
+            content = rng.choice(MARKDOWN_SAMPLES).format(n=n)
+        else:
+            content = f"message number {n}, see you at noon"
+        rows.append({
+            "id": n,
+            "sender_id": USER_ID if n % 2 else "them",
+            "content": content,
+        })
+    return rows
+
+
+def render(msg, prepare):
+    sender_name = "You" if msg["sender_id"] == USER_ID else "Them"
+    body = prepare(msg["content"])
+    if body is None:
+        return ft.Text(f"{sender_name}: {msg['content']}")
+    separator = "\n\n" if body.block else " "
+    return ft.Markdown(
+        f"**{sender_name}:**{separator}{body.markdown}",
+        selectable=True,
+        soft_line_break=True,
+        extension_set=ft.MarkdownExtensionSet.GITHUB_WEB,
+        code_theme=ft.MarkdownCodeTheme.GITHUB,
+    )
+
+
+def cached():
+    cache = markdown_cache()
+    return lambda content: markdown_body(content, cache)
+
+
+# Each mode makes a fresh `prepare` per run, so the cached mode starts cold.
+MODES = {
+    "parse always": lambda: parse,
+    "fast path": lambda: markdown_body,
+    "cached": cached,
+}
+
+
+def warm_average(timings):
+    return sum(timings[1:]) / max(1, len(timings) - 1)
+
+
+def bench(rows, make_prepare, rebuilds: int):
+    prepare = make_prepare()
+    timings = []
+    for _ in range(rebuilds):
+        start = time.perf_counter()
+        controls = [render(row, prepare) for row in rows]
+        timings.append(time.perf_counter() - start)
+    assert len(controls) == len(rows)
+
+    prepare = make_prepare()
+    prepare_timings = []
+    for _ in range(rebuilds):
+        start = time.perf_counter()
+        for row in rows:
+            prepare(row["content"])
+        prepare_timings.append(time.perf_counter() - start)
+    return timings[0], warm_average(timings), warm_average(prepare_timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=5_000)
+    parser.add_argument("--rebuilds", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.messages)
+    print(f"{args.messages} messages, {sum(not looks_plain(r['content']) for r in rows)} with Markdown")
+    print(f"{'mode':<14} {'cold ms':>9} {'rebuild ms':>11} {'us/msg':>8} {'prepare ms':>11}")
+    for name, make_prepare in MODES.items():
+        cold, warm, prepare = bench(rows, make_prepare, args.rebuilds)
+        print(
+            f"{name:<14} {cold * 1e3:>9.1f} {warm * 1e3:>11.1f} {warm / len(rows) * 1e6:>8.1f} "
+            f"{prepare * 1e3:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
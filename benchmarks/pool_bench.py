@@ -0,0 +1,134 @@
+"""
+Connection count and request latency with 100+ concurrent sessions.
+
+A local keep-alive HTTP server stands in for PostgREST (with a small fixed
+service time) and counts the TCP connections it accepts. Every session
+gets its own Supabase client and runs PostgREST queries through it:
+
+  per-session   acreate_client() with default options, so each client
+                opens its own HTTP connection pool
+  factory       clients.ClientFactory.create(), the app's path: one
+                client per session on top of the shared, bounded pool
+
+The shared pool bounds the number of open sockets, not latency: once more
+sessions are in flight than the pool has connections
+(SUPABASE_POOL_MAX_CONNECTIONS), requests queue for one.
+
+    python benchmarks/pool_bench.py [--sessions 100 250] [--requests 10]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from supabase import AsyncClientOptions, acreate_client
+
+from clients import ClientFactory
+
+SERVICE_TIME = 0.002
+
+
+def _segment(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+
+# supabase-py only accepts JWT-shaped API keys.
+API_KEY = f"{_segment({'alg': 'HS256', 'typ': 'JWT'})}.{_segment({'role': 'anon'})}.signature"
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with CountingHandler.lock:
+            CountingHandler.connections += 1
+
+    def do_GET(self):
+        time.sleep(SERVICE_TIME)
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    # The default listen backlog (5) refuses connections when hundreds of
+    # sessions connect at once.
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+async def run_sessions(clients, requests):
+    latencies = []
+
+    async def session(client):
+        for _ in range(requests):
+            start = time.perf_counter()
+            await client.table("messages").select("*").limit(1).execute()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(session(client) for client in clients))
+    return latencies
+
+
+def report(label, sessions, latencies):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{label:>12} {sessions:>8} {CountingHandler.connections:>12} "
+        f"{statistics.median(latencies) * 1e3:>9.2f} {p99 * 1e3:>9.2f}"
+    )
+
+
+async def bench(url, factory, sessions, requests):
+    CountingHandler.connections = 0
+    options = AsyncClientOptions(auto_refresh_token=False)
+    own = [await acreate_client(url, API_KEY, options=options) for _ in range(sessions)]
+    report("per-session", sessions, await run_sessions(own, requests))
+
+    CountingHandler.connections = 0
+    pooled = [await factory.create() for _ in range(sessions)]
+    report("factory", sessions, await run_sessions(pooled, requests))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 250])
+    parser.add_argument("--requests", type=int, default=10)
+    args = parser.parse_args()
+
+    server = Server(("127.0.0.1", 0), CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    factory = ClientFactory(url, API_KEY)
+    print(f"shared pool: {factory.max_connections} connections, {factory.max_keepalive} kept alive")
+
+    print(f"{'clients':>12} {'sessions':>8} {'connections':>12} {'p50 ms':>9} {'p99 ms':>9}")
+    # One loop for every run: the factory's shared httpx.AsyncClient is bound to it.
+    async def run_all():
+        for sessions in args.sessions:
+            await bench(url, factory, sessions, args.requests)
+
+    asyncio.run(run_all())
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Per-message render cost as the conversation grows.
+
+Compares the old full-rebuild path (clear and recreate one control per
+message on every incoming message) with MessageListRenderer.append.
+
+    python benchmarks/render_bench.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import flet as ft
+
+from message_view import MessageListRenderer
+
+HISTORY_SIZES = [100, 1_000, 5_000, 20_000]
+NEW_MESSAGES = 200
+USER_ID = "me"
+
+
+def make_rows(n):
+    return [
+        {
+            "id": i,
+            "sender_id": USER_ID if i % 2 else "them",
+            "receiver_id": "them" if i % 2 else USER_ID,
+            "content": f"message number {i}",
+            "created_at": f"2025-01-01T00:00:{i:09d}",
+        }
+        for i in range(n)
+    ]
+
+
+def render_message(msg, control=None):
+    sender_name = "You" if msg["sender_id"] == USER_ID else "Them"
+    text = f"{sender_name}: {msg['content']}"
+    if control is None:
+        return ft.Text(text)
+    control.value = text
+    return control
+
+
+def bench_full_rebuild(history, incoming):
+    list_view = ft.ListView()
+    rows = list(history)
+    start = time.perf_counter()
+    for msg in incoming:
+        rows.append(msg)
+        list_view.controls.clear()
+        for row in rows:
+            list_view.controls.append(render_message(row))
+    elapsed = time.perf_counter() - start
+    return elapsed / len(incoming), len(list_view.controls)
+
+
+def bench_append(history, incoming):
+    list_view = ft.ListView()
+    renderer = MessageListRenderer(list_view, render_message)
+    renderer.reset(history)
+    start = time.perf_counter()
+    for msg in incoming:
+        renderer.append(msg)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(incoming), len(list_view.controls)
+
+
+def main():
+    print(f"{'history':>8} | {'rebuild us/msg':>15} {'mounted':>8} | {'append us/msg':>14} {'mounted':>8}")
+    for size in HISTORY_SIZES:
+        rows = make_rows(size + NEW_MESSAGES)
+        history, incoming = rows[:size], rows[size:]
+        # The rebuild path is quadratic overall; sample fewer events for big histories.
+        rebuild_incoming = incoming[: max(5, NEW_MESSAGES * 1_000 // max(size, 1_000))]
+        rebuild, rebuild_mounted = bench_full_rebuild(history, rebuild_incoming)
+        append, append_mounted = bench_append(history, incoming)
+        print(
+            f"{size:>8} | {rebuild * 1e6:>15.1f} {rebuild_mounted:>8} | "
+            f"{append * 1e6:>14.1f} {append_mounted:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Search latency of the in-memory index over a large conversation.
+
+Builds a SearchIndex over synthetic messages (a few thousand-word
+vocabulary, so common words have large posting lists), then times
+typical queries: rare and common words, multi-word, and prefixes as
+they are typed.
+
+    python benchmarks/search_bench.py [--messages 100000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from search_index import SearchIndex
+
+QUERIES = ["hello", "meeting tomorrow", "w", "wor", "word1234", "lunch at noon", "zzz-no-match"]
+REPEAT = 50
+
+
+def make_rows(count: int, vocabulary: int = 5000):
+    rng = random.Random(1)
+    common = ["hello", "meeting", "tomorrow", "lunch", "at", "noon", "ok", "thanks", "see", "you"]
+    words = common + [f"word{n}" for n in range(vocabulary)]
+    weights = [50] * len(common) + [1] * vocabulary
+    return [
+        {
+            "id": str(n),
+            "sender_id": "me" if n % 2 else "peer",
+            "receiver_id": "peer" if n % 2 else "me",
+            "content": " ".join(rng.choices(words, weights, k=rng.randint(3, 15))),
+            "created_at": f"2025-01-01T00:00:00.{n:06d}",
+        }
+        for n in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.messages)
+    # Uncapped, to time the index itself at this size; the app keeps DEFAULT_CAPACITY.
+    index = SearchIndex(capacity=args.messages + 1000)
+    start = time.perf_counter()
+    index.add(rows)
+    print(f"indexed {len(index)} messages in {(time.perf_counter() - start) * 1e3:.0f} ms")
+
+    start = time.perf_counter()
+    for n, row in enumerate(rows[:1000]):
+        index.add([dict(row, id=f"new-{n}", created_at=f"2025-01-02T00:00:00.{n:06d}")])
+    print(f"incremental add: {(time.perf_counter() - start) / 1000 * 1e6:.1f} us per message\n")
+
+    print(f"{'query':<18} {'hits':>6} {'p50 ms':>8} {'max ms':>8}")
+    for query in QUERIES:
+        timings = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            hits = index.search(query)
+            timings.append(time.perf_counter() - start)
+        print(f"{query:<18} {len(hits):>6} {statistics.median(timings) * 1e3:>8.2f} {max(timings) * 1e3:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Cold-start cost of the app: import time of `main` and time to the first
+`home_view`, each measured in a fresh interpreter.
+
+Also lists which heavy modules were loaded by then; `supabase`, `qrcode`,
+`PIL` and `chat` should only appear once `/chat` is visited or warmed.
+
+    python benchmarks/startup_bench.py [--runs 5] [--max-ms 1500]
+
+With --max-ms the script exits non-zero if the median time to the first
+home view exceeds the budget, so it can gate regressions in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+HEAVY_MODULES = ["supabase", "qrcode", "PIL", "chat"]
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from home import home_view
+home_view(None, main.get_client, main.auth.login, main.auth.signup)
+rendered = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1e3,
+    "home_ms": (rendered - start) * 1e3,
+    "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_probe() -> dict:
+    env = dict(os.environ)
+    env.setdefault("SUPABASE_URL", "http://localhost:54321")
+    env.setdefault("SUPABASE_KEY", "benchmark-key")
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=SRC, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    results = [run_probe() for _ in range(args.runs)]
+    import_ms = statistics.median(r["import_ms"] for r in results)
+    home_ms = statistics.median(r["home_ms"] for r in results)
+    print(f"import main:       {import_ms:8.1f} ms (median of {args.runs})")
+    print(f"first home_view:   {home_ms:8.1f} ms")
+    print(f"heavy modules loaded at first paint: {results[-1]['loaded'] or 'none'}")
+
+    if args.max_ms is not None and home_ms > args.max_ms:
+        print(f"REGRESSION: {home_ms:.1f} ms > budget {args.max_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Memory held per session for a 10k-message conversation.
+
+"before" is the old representation: a list of the full row dicts that
+`select("*")` returns. "after" is MessageStore at its default capacity, and
+uncapped for comparison.
+
+    python benchmarks/store_memory_bench.py
+"""
+import os
+import sys
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from message_store import DEFAULT_CAPACITY, MessageStore
+
+MESSAGES = 10_000
+
+
+def make_rows(n):
+    me, peer = str(uuid.uuid4()), str(uuid.uuid4())
+    rows = []
+    for i in range(n):
+        sender, receiver = (me, peer) if i % 2 else (peer, me)
+        rows.append({
+            "id": str(uuid.uuid4()),
+            # Fresh strings per row, as the JSON decoder produces them.
+            "sender_id": "".join(sender),
+            "receiver_id": "".join(receiver),
+            "content": f"message number {i} with some typical chat length text",
+            "created_at": f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}+00:00",
+            "updated_at": None,
+            "read_at": None,
+        })
+    return rows
+
+
+def measure(build):
+    """Bytes still allocated once the fetched rows have been handed to `build`."""
+    tracemalloc.start()
+    rows = make_rows(MESSAGES)
+    held = build(rows)
+    del rows
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, held
+
+
+def main():
+    def as_list(rows):
+        return list(rows)
+
+    def capped_store(rows):
+        store = MessageStore()
+        store.add(rows)
+        return store
+
+    def uncapped_store(rows):
+        store = MessageStore(capacity=MESSAGES)
+        store.add(rows)
+        return store
+
+    print(f"{MESSAGES} messages in one conversation")
+    for label, build in [
+        ("list of row dicts (before)", as_list),
+        ("MessageStore, uncapped", uncapped_store),
+        (f"MessageStore, capacity {DEFAULT_CAPACITY}", capped_store),
+    ]:
+        size, held = measure(build)
+        print(f"{label:>32}: {size / 1024:8.0f} KiB for {len(held)} messages held")
+
+
+if __name__ == "__main__":
+    main()
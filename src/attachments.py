@@ -0,0 +1,315 @@
+"""
+Image and file attachments.
+
+Files are streamed to Supabase Storage through its resumable (TUS)
+endpoint one chunk at a time, hashing as they go, so an upload holds a
+single chunk in memory however large the file is. Image thumbnails are
+rendered in a process pool. The sender stores each one in its own folder,
+named after the SHA-256 this server computed while uploading, so
+recipients download a few kilobytes instead of the original. Thumbnails
+are cached by that storage path, in memory and on disk, so one that was
+already seen is never fetched or decoded again. A message can't plant an
+entry under someone else's key: only thumbnails in the sender's own
+folder are shown.
+"""
+import asyncio
+import base64
+import hashlib
+import inspect
+import io
+import mimetypes
+import multiprocessing
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from db import call
+from message_cache import default_cache_dir
+from metrics import timed
+from ttl_cache import TTLCache
+
+BUCKET = os.environ.get("CHAT_ATTACHMENTS_BUCKET", "attachments")
+# Supabase's resumable upload endpoint takes 6 MB chunks.
+CHUNK_SIZE = 6 * 1024 * 1024
+THUMBNAIL_SIZE = (320, 320)
+UPLOAD_ATTEMPTS = 5
+
+_thumbnails = TTLCache(maxsize=512, ttl=24 * 60 * 60)  # storage path -> base64 JPEG
+_in_flight = {}  # storage path -> Future shared by concurrent requests for one thumbnail
+_pool = None
+
+
+def upload_dir() -> str:
+    """Where Flet saves files uploaded from the browser (CHAT_UPLOAD_DIR)."""
+    return os.environ.get("CHAT_UPLOAD_DIR") or os.path.join(tempfile.gettempdir(), "chat_app_uploads")
+
+
+def safe_name(name: str) -> str:
+    """A client-supplied file name reduced to its last path component."""
+    name = os.path.basename((name or "").replace("\\", "/")).strip()
+    return name if name not in ("", ".", "..") else "file"
+
+
+def upload_path(relative: str) -> str:
+    """The absolute path of an upload under upload_dir(); ValueError if it would land elsewhere."""
+    root = os.path.realpath(upload_dir())
+    path = os.path.realpath(os.path.join(root, relative))
+    if path == root or os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Upload path outside {root}: {relative!r}")
+    return path
+
+
+def discard_upload(path: str):
+    """Deletes a browser upload's folder, which must sit directly inside upload_dir()."""
+    root = os.path.realpath(upload_dir())
+    folder = os.path.dirname(os.path.realpath(path))
+    if os.path.dirname(folder) != root:
+        raise ValueError(f"Not an upload folder: {folder}")
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def _thumbnail_dir() -> str:
+    return os.environ.get("CHAT_THUMBNAIL_CACHE_DIR") or os.path.join(default_cache_dir(), "thumbnails")
+
+
+def is_image(mime: str) -> bool:
+    return bool(mime) and mime.startswith("image/")
+
+
+# --- Thumbnails ---
+
+def make_thumbnail(path: str, size=THUMBNAIL_SIZE) -> bytes:
+    """A JPEG thumbnail of the image at `path`. Runs in the thumbnail pool."""
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as img:
+        # JPEGs decode straight at a reduced scale instead of full size.
+        img.draft("RGB", size)
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(size)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buffered = io.BytesIO()
+        img.save(buffered, format="JPEG", quality=80, optimize=True)
+    return buffered.getvalue()
+
+
+def _executor():
+    """
+    The thumbnail pool: CHAT_THUMBNAIL_WORKERS processes (default 2).
+    Multi-worker mode runs daemonic processes, which can't have children;
+    those render in threads, where PIL releases the GIL while decoding.
+    """
+    global _pool
+    if _pool is None:
+        workers = int(os.environ.get("CHAT_THUMBNAIL_WORKERS") or 2)
+        if multiprocessing.current_process().daemon:
+            _pool = ThreadPoolExecutor(workers, thread_name_prefix="thumbnail")
+        else:
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def render_thumbnail(path: str) -> bytes:
+    """Renders a thumbnail in the pool, keeping the event loop free."""
+    with timed("attachments.render_thumbnail"):
+        return await asyncio.get_running_loop().run_in_executor(_executor(), make_thumbnail, path)
+
+
+def thumbnail_path(attachment: dict, sender_id: str):
+    """The attachment's stored thumbnail if it is in the sender's own folder, else None."""
+    path = attachment.get("thumbnail")
+    if not path or not path.startswith(f"{sender_id}/") or "\\" in path:
+        return None
+    # "sender/../other/x.jpg" would still start with the sender's folder.
+    return None if any(part in ("", ".", "..") for part in path.split("/")) else path
+
+
+def peek_thumbnail(key: str):
+    """An already loaded thumbnail (base64 JPEG) for a storage path, or None."""
+    return _thumbnails.get(key) if key else None
+
+
+def _stored_path(key: str) -> str:
+    return os.path.join(_thumbnail_dir(), f"{hashlib.sha256(key.encode()).hexdigest()}.jpg")
+
+
+def _read_stored(key: str):
+    path = _stored_path(key)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _store(key: str, data: bytes):
+    path = _stored_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+async def thumbnail(key: str, produce) -> str:
+    """
+    The thumbnail stored at `key` as base64 JPEG, from memory, then disk,
+    and only then from `await produce()` (which returns JPEG bytes).
+    Concurrent calls for the same key share one `produce`.
+    """
+    src = _thumbnails.get(key)
+    if src is not None:
+        return src
+    pending = _in_flight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    pending = _in_flight[key] = asyncio.get_running_loop().create_future()
+    try:
+        data = await asyncio.to_thread(_read_stored, key)
+        if data is None:
+            data = await produce()
+            await asyncio.to_thread(_store, key, data)
+        src = base64.b64encode(data).decode()
+        _thumbnails.set(key, src)
+        pending.set_result(src)
+        return src
+    except BaseException as e:
+        pending.set_exception(e)
+        # Retrieved here so an unawaited failure isn't logged as never retrieved.
+        pending.exception()
+        raise
+    finally:
+        del _in_flight[key]
+
+
+# --- Storage ---
+
+def _http(supabase):
+    return getattr(getattr(supabase, "options", None), "httpx_client", None)
+
+
+async def _request(http, method: str, url: str, **kwargs):
+    if inspect.iscoroutinefunction(http.request):
+        response = await http.request(method, url, **kwargs)
+    else:
+        response = await asyncio.to_thread(http.request, method, url, **kwargs)
+    response.raise_for_status()
+    return response
+
+
+def _read_chunk(f, digest, size: int) -> bytes:
+    chunk = f.read(size)
+    digest.update(chunk)
+    return chunk
+
+
+async def upload_file(supabase, access_token: str, path: str, object_name: str, content_type: str,
+                      chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    Streams the file at `path` to `BUCKET/object_name` in `chunk_size`
+    pieces and returns its SHA-256. A failed chunk is retried from the
+    offset the server reports, so a dropped connection resumes instead of
+    starting over.
+    """
+    http = _http(supabase)
+    if http is None:
+        raise RuntimeError("Attachments need the shared HTTP client (see clients.py)")
+    headers = {
+        "apikey": supabase.supabase_key,
+        "authorization": f"Bearer {access_token}",
+        "tus-resumable": "1.0.0",
+    }
+    metadata = {"bucketName": BUCKET, "objectName": object_name, "contentType": content_type, "cacheControl": "3600"}
+    size = os.path.getsize(path)
+    digest = hashlib.sha256()
+
+    with timed("attachments.upload"):
+        created = await _request(http, "POST", str(supabase.supabase_url.joinpath("storage/v1/upload/resumable")), headers={
+            **headers,
+            "upload-length": str(size),
+            "upload-metadata": ",".join(f"{k} {base64.b64encode(v.encode()).decode()}" for k, v in metadata.items()),
+        })
+        location = created.headers["location"]
+        with open(path, "rb") as f:
+            offset = 0
+            while offset < size:
+                chunk = await asyncio.to_thread(_read_chunk, f, digest, chunk_size)
+                offset = await _send_chunk(http, location, headers, offset, chunk)
+    return digest.hexdigest()
+
+
+async def _send_chunk(http, location: str, headers: dict, offset: int, chunk: bytes) -> int:
+    end = offset + len(chunk)
+    for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+        try:
+            response = await _request(http, "PATCH", location, content=chunk, headers={
+                **headers,
+                "upload-offset": str(offset),
+                "content-type": "application/offset+octet-stream",
+            })
+            return int(response.headers.get("upload-offset", end))
+        except Exception as e:
+            if attempt == UPLOAD_ATTEMPTS:
+                raise
+            print(f"Error uploading chunk at {offset} (attempt {attempt}): {e}")
+            await asyncio.sleep(min(30, 0.5 * 2 ** attempt))
+            try:
+                # The chunk may have landed before the connection dropped.
+                status = await _request(http, "HEAD", location, headers=headers)
+                received = int(status.headers["upload-offset"])
+            except Exception:
+                continue
+            if received == end:
+                return end
+            if received != offset:
+                raise RuntimeError(f"Upload resumed at {received}, expected {offset}") from e
+    return end
+
+
+async def download(supabase, object_name: str) -> bytes:
+    """Downloads a (small) stored object, e.g. a thumbnail."""
+    return await call(supabase.storage.from_(BUCKET).download, object_name)
+
+
+async def signed_url(supabase, object_name: str, expires_in: int = 3600) -> str:
+    """A temporary link to a stored attachment, for opening it in the browser."""
+    response = await call(supabase.storage.from_(BUCKET).create_signed_url, object_name, expires_in)
+    return response.get("signedURL") or response.get("signedUrl")
+
+
+async def send_file(supabase, access_token: str, user_id: str, path: str, name: str) -> dict:
+    """
+    Uploads a file (and, for images, its thumbnail) and returns the
+    `attachment` metadata to store on the message.
+    """
+    name = safe_name(name)
+    mime = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    object_name = f"{user_id}/{uuid.uuid4()}/{name}"
+    digest = await upload_file(supabase, access_token, path, object_name, mime)
+    attachment = {
+        "path": object_name,
+        "name": name,
+        "size": os.path.getsize(path),
+        "mime": mime,
+        "sha256": digest,
+        "thumbnail": None,
+    }
+    if is_image(mime):
+        try:
+            # Named by the hash computed above, so resending an image overwrites it with identical bytes.
+            thumbnail_name = f"{user_id}/thumbnails/{digest}.jpg"
+            src = await thumbnail(thumbnail_name, lambda: render_thumbnail(path))
+            await call(
+                supabase.storage.from_(BUCKET).upload,
+                thumbnail_name,
+                base64.b64decode(src),
+                {"content-type": "image/jpeg", "upsert": "true"},
+            )
+            attachment["thumbnail"] = thumbnail_name
+        except Exception as e:
+            # Still sent; recipients see a file icon instead of a preview.
+            print(f"Error creating thumbnail for {name}: {e}")
+    return attachment
@@ -3,58 +3,78 @@ from flet import Text, SnackBar, Colors
 
 from flet import SnackBar, Text, Colors
 
-def login(page, event, email_tf, password_tf, supabase):
+from db import call
+from identity import identity_for
+from metrics import instrument
+from render_scheduler import schedule_update
+from view_cache import view_cache_for
+
+@instrument("auth.login")
+async def login(page, event, email_tf, password_tf, supabase):
     email = email_tf.value.strip()
     password = password_tf.value.strip()
 
     if not email or not password:
         page.open(SnackBar(Text("Email and password required", bgcolor=Colors.RED)))
-        page.update()
+        schedule_update(page)
         return
 
     try:
-        response = supabase.auth.sign_in_with_password({"email": email, "password": password})
-        user = response.user
+        response = await call(supabase.auth.sign_in_with_password, {"email": email, "password": password})
         if response.user is not None:
-            # ✅ Store email using page.session (synchronous)
-            page.session.set("user_email", response.user.email)
-            page.session.set("user_id", user.id)
+            # Decodes the token locally and stores user_id/user_email in page.session.
+            await identity_for(page).establish(supabase, response.session)
             page.open(SnackBar(Text(f"Logged in as {response.user.email}", bgcolor=Colors.GREEN)))
-            page.update()
+            schedule_update(page)
             page.go("/chat")
         else:
             page.open(SnackBar(Text("Login failed: Invalid credentials", bgcolor=Colors.RED)))
-            page.update()
+            schedule_update(page)
     except Exception as e:
         page.open(SnackBar(Text(f"Error: {str(e)}", bgcolor=Colors.RED)))
-        page.update()
+        schedule_update(page)
 
-def signup(page, event, email_tf, password_tf, supabase):
+@instrument("auth.signup")
+async def signup(page, event, email_tf, password_tf, supabase):
     email = email_tf.value.strip()
     password = password_tf.value.strip()
 
     if not email or not password:
         page.open(SnackBar(Text("Email and password required", bgcolor=Colors.RED)))
-        page.update()
+        schedule_update(page)
         return
 
     try:
-        user = supabase.auth.sign_up({"email": email, "password": password})
+        user = await call(supabase.auth.sign_up, {"email": email, "password": password})
         if user.user:
             message = f"Signed up as {user.user.email}. Please confirm your email address."
 
-            # ✅ Use page.session for synchronous session storage
-            page.session.set("user_email", user.user.email)
+            if user.session is not None:
+                # Email confirmation is off: the user is signed in right away.
+                await identity_for(page).establish(supabase, user.session)
+            else:
+                page.session.set("user_email", user.user.email)
 
             page.open(SnackBar(Text(message, bgcolor=Colors.GREEN)))
-            page.update()
+            schedule_update(page)
 
             # ✅ Optionally redirect after signup
             page.go("/chat")
         else:
             message = "Sign up failed. No user returned."
             page.open(SnackBar(Text(message, bgcolor=Colors.RED)))
-            page.update()
+            schedule_update(page)
     except Exception as e:
         page.open(SnackBar(Text(f"Error: {str(e)}", bgcolor=Colors.RED)))
-        page.update()
+        schedule_update(page)
+
+@instrument("auth.logout")
+async def logout(page, supabase):
+    # Drop the cached chat view first so its realtime listeners stop.
+    view_cache_for(page).invalidate()
+    await identity_for(page).forget()
+    try:
+        await call(supabase.auth.sign_out)
+    except Exception as e:
+        print(f"Error signing out: {e}")
+    page.go("/")
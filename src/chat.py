@@ -1,21 +1,27 @@
+import asyncio
 import flet as ft
 import hashlib
-import qrcode
-import io
-import base64
-
-def generate_qr_code(data: str) -> str:
-    """Generates a base64-encoded QR code image from text data."""
-    qr = qrcode.QRCode(version=1, box_size=4, border=2)
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color='black', back_color='white')
-
-    buffered = io.BytesIO()
-    img.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return f"data:image/png;base64,{img_str}"
-
+import os
+import uuid
+
+from attachments import discard_upload, download, peek_thumbnail, safe_name, send_file, signed_url, thumbnail, thumbnail_path, upload_path
+from auth import logout
+from contacts import directory
+from db import execute
+from history import PAGE_SIZE, cursor, fetch_page, fetch_since, search_page
+from identity import identity_for
+from inbox import Inbox
+from message_cache import MessageCache
+from message_store import Message, MessageStore
+from message_view import MessageListRenderer
+from metrics import instrument
+from outbox import FAILED, Outbox, new_message
+from qr_codes import generate_qr_code, peek_qr_code
+from realtime_hub import hub
+from render_scheduler import EventQueue, scheduler_for
+from rich_text import is_safe_link, markdown_body, markdown_cache
+from search_index import SearchIndex, tokenize
+from view_cache import view_cache_for
 
 # --- Main Chat View ---
 
@@ -29,191 +35,730 @@ def chat_view(page: ft.Page, supabase, user_id: str):
     
     # This will hold the Supabase Realtime subscription object
     subscription = None
-    chat_messages = []
+    inbox_subscription = None
+    # Compact, capped and de-duplicated by message id (see MessageStore).
+    chat_messages = MessageStore()
+    message_cache = MessageCache(user_id)
+    inbox = Inbox(user_id)
+    has_older_messages = False
+    # Newest position of the open chat received from the server (fetches and
+    # realtime), never one of our own sends: the lower bound for gap fills.
+    server_cursor = None
+    loading_older = False
+    # The open conversation's search index (capped, see SearchIndex), built
+    # from the cache on first open and dropped when another chat is opened.
+    search_indexes = {}
+    indexed_peers = set()
+    search_position = None
+    # (pixels, max_scroll_extent, viewport) of the last scroll, for lazy thumbnails.
+    scroll_position = None
+    # Whether the list is scrolled to the bottom, and so follows new messages there.
+    at_bottom = True
+    follow_latest = False
+    # Browser uploads in flight: path under upload_dir() -> (file name, peer id).
+    uploads = {}
+    # Prepared Markdown bodies, reused by list resets and search results.
+    markdown_bodies = markdown_cache()
 
     # --- Flet UI Controls ---
     current_chat_partner_uuid = None
 
     chat_app_bar_title = ft.Text("Flet & Supabase Chat 💬")
 
-    message_list = ft.ListView(expand=True, spacing=10, padding=20, auto_scroll=True)
-    input_message = ft.TextField(hint_text="Type a message...", expand=True, on_submit=lambda e: send_message(e))
-
-    user_email = supabase.auth.get_user().user.email
-    qr_img = ft.Image(src=generate_qr_code(user_id), width=150, height=150)
+    message_list = ft.ListView(expand=True, spacing=10, padding=20, on_scroll_interval=100)
+    input_message = ft.TextField(hint_text="Type a message...", expand=True)
+    search_field = ft.TextField(hint_text="Search this conversation", prefix_icon=ft.Icons.SEARCH, dense=True)
+    search_results = ft.ListView(expand=True, spacing=10, padding=20, visible=False)
+    search_older_btn = ft.TextButton("Search older messages", icon=ft.Icons.HISTORY, visible=False)
+
+    # The QR code is generated off the request path; show a placeholder until it's ready.
+    qr_src = peek_qr_code(user_id)
+    qr_img = ft.Container(
+        width=150,
+        height=150,
+        alignment=ft.alignment.center,
+        content=ft.Image(src=qr_src, width=150, height=150) if qr_src else ft.ProgressRing(),
+    )
     new_contact_id_input = ft.TextField(label="Enter Contact's Email")
     contacts_list_view = ft.ListView(expand=True, spacing=5)
+    inbox_switch = ft.Switch(label="Inbox", value=True)
+    # Contact tiles by the contact's UUID, so realtime updates touch one tile.
+    contact_tiles = {}
 
     # --- Core Functions ---
 
-    def update_message_list():
-        """Clears and rebuilds the message list from the chat_messages list."""
-        message_list.controls.clear()
-        for msg in chat_messages:
-            sender_name = "You" if msg['sender_id'] == user_id else "Them"
-            message_list.controls.append(
-                ft.Text(f"{sender_name}: {msg['content']}")
+    def render_message(msg, control=None):
+        """Builds (or refreshes a recycled) control for a single message."""
+        sender_name = "You" if msg['sender_id'] == user_id else "Them"
+        state = outbox.state(msg['id'])
+        marker = ("(not sent)" if state == FAILED else "(sending…)") if state else None
+        # Plain text, the common case, never touches the Markdown parser.
+        body = None if msg['attachment'] else markdown_body(msg['content'], markdown_bodies)
+        if body is None:
+            text = f"{sender_name}: {msg['content']}" + (f" {marker}" if marker else "")
+            if msg['attachment']:
+                return render_attachment(msg, text, control)
+            if not isinstance(control, ft.Text):
+                return ft.Text(text)
+            control.value = text
+            return control
+
+        separator = "\n\n" if body.block else " "
+        value = f"**{sender_name}:**{separator}{body.markdown}" + (f"{separator}_{marker}_" if marker else "")
+        if not isinstance(control, ft.Markdown):
+            return ft.Markdown(
+                value,
+                selectable=True,
+                soft_line_break=True,
+                extension_set=ft.MarkdownExtensionSet.GITHUB_WEB,
+                code_theme=ft.MarkdownCodeTheme.GITHUB,
+                on_tap_link=open_link,
             )
-        page.update()
-
-    def on_new_message(payload):
-        """Callback for Supabase Realtime subscription. Appends new messages."""
-        nonlocal chat_messages
-        new_msg = payload['new']
-        target_user_id = target_id_input.value.strip()
-
-        # Check if the new message belongs to the current active chat
-        is_relevant = (
-            (new_msg['sender_id'] == user_id and new_msg['receiver_id'] == target_user_id) or
-            (new_msg['sender_id'] == target_user_id and new_msg['receiver_id'] == user_id)
-        )
-
-        if is_relevant:
-            chat_messages.append(new_msg)
-            update_message_list()
+        control.value = value
+        return control
+
+    def open_link(e):
+        # Bodies are sanitized already; this also covers anything the parser missed.
+        if is_safe_link(e.data):
+            page.launch_url(e.data)
+
+    def render_attachment(msg, text, control=None):
+        """
+        A file message: its label and a preview slot. The thumbnail is only
+        fetched once the message scrolls into view (see load_visible_thumbnails).
+        """
+        attachment = msg['attachment']
+        if not isinstance(control, ft.Column):
+            control = ft.Column(spacing=4, controls=[
+                ft.Text(),
+                ft.Container(width=160, height=120, border_radius=8, bgcolor=ft.Colors.BLACK12, alignment=ft.alignment.center),
+            ])
+        label, slot = control.controls
+        label.value = text
+        if control.data != msg['id']:
+            # New or recycled from another message: reset the preview.
+            control.data = msg['id']
+            key = thumbnail_path(attachment, msg['sender_id'])
+            src = peek_thumbnail(key)
+            if src:
+                slot.content, slot.data = ft.Image(src_base64=src, fit=ft.ImageFit.CONTAIN), "loaded"
+            elif key:
+                slot.content, slot.data = ft.Icon(ft.Icons.IMAGE), None
+            else:
+                slot.content, slot.data = ft.Icon(ft.Icons.INSERT_DRIVE_FILE), "none"
+            slot.on_click = lambda _, a=attachment: page.run_task(open_attachment, a)
+        return control
+
+    scheduler = scheduler_for(page)
+    incoming = EventQueue()
+    renderer = MessageListRenderer(message_list, render_message, request_update=scheduler.request)
+
+    def search_index_for(peer_id):
+        """The index of `peer_id`'s chat; one for a chat that is no longer open isn't kept."""
+        index = search_indexes.get(peer_id)
+        if index is None:
+            index = SearchIndex()
+            if peer_id == current_chat_partner_uuid:
+                search_indexes.clear()
+                indexed_peers.clear()
+                search_indexes[peer_id] = index
+        return index
+
+    def show_sent(row):
+        """Swaps a pending message for its stored copy (server timestamp, no marker)."""
+        message = chat_messages.update(row)
+        if message is not None:
+            renderer.update(message)
+        if row['receiver_id'] in search_indexes:
+            search_indexes[row['receiver_id']].add([row])
+
+    async def cache_rows(peer_id, rows):
+        """Writes rows to the on-disk cache off the event loop."""
+        try:
+            await asyncio.to_thread(message_cache.upsert, peer_id, rows)
+        except Exception as e:
+            print(f"Error caching messages: {e}")
+
+    def on_outbox_sent(rows):
+        for row in rows:
+            page.run_task(cache_rows, row['receiver_id'], [row])
+            show_sent(row)
+
+    def on_outbox_state(rows):
+        for row in rows:
+            renderer.update(Message.from_row(row))
+        if any(outbox.state(row['id']) == FAILED for row in rows):
+            page.open(ft.SnackBar(
+                ft.Text("❌ Some messages couldn't be sent."),
+                action="Retry",
+                on_action=lambda _: page.run_task(retry_unsent),
+                duration=10_000,
+            ))
+            scheduler.request()
+
+    async def retry_unsent():
+        outbox.retry_failed()
+
+    outbox = Outbox(supabase, on_sent=on_outbox_sent, on_state=on_outbox_state)
+
+    def note_delivered(rows):
+        """Advances server_cursor past rows the server delivered."""
+        nonlocal server_cursor
+        for row in rows:
+            if server_cursor is None or cursor(row) > server_cursor:
+                server_cursor = cursor(row)
 
-    def load_messages():
-        """Loads the initial message history for a chat."""
-        nonlocal chat_messages
-        target_user_id = target_id_input.value.strip()
+    def update_message_list():
+        """Re-renders the newest window of chat_messages after a full reload."""
+        nonlocal scroll_position, at_bottom, follow_latest
+        renderer.reset(chat_messages.latest(renderer.max_mounted))
+        scroll_position = None
+        at_bottom = follow_latest = True
+        load_visible_thumbnails()
+
+    def scroll_to_latest():
+        """Runs after each flush: scrolls to messages added while the list was at the bottom."""
+        nonlocal follow_latest
+        if follow_latest:
+            follow_latest = False
+            # A cached view that isn't on screen has nothing to scroll.
+            if message_list.page is not None:
+                message_list.scroll_to(offset=-1, duration=200)
+
+    @instrument("chat.on_new_message")
+    def on_new_message(row):
+        """Callback for Supabase Realtime subscription. Queues the message for the next frame."""
+        incoming.put(row)
+        scheduler.request(message_list)
+
+    @instrument("chat.apply_incoming")
+    def apply_incoming():
+        """Drains queued realtime messages into the list in one batch per frame."""
+        nonlocal follow_latest
+        target_user_id = current_chat_partner_uuid
+        batch = incoming.drain()
+        if incoming.overflowed:
+            # Messages were dropped under load; catch up from the cache cursor instead.
+            incoming.overflowed = False
+            page.run_task(load_messages)
+
+        # Check which new messages belong to the current active chat
+        relevant = [
+            new_msg for new_msg in batch
+            if (new_msg['sender_id'] == user_id and new_msg['receiver_id'] == target_user_id) or
+               (new_msg['sender_id'] == target_user_id and new_msg['receiver_id'] == user_id)
+        ]
+
+        if relevant:
+            page.run_task(cache_rows, target_user_id, relevant)
+            # The echo of our own pending message confirms it if the insert response hasn't yet.
+            for new_msg in relevant:
+                if outbox.confirm(new_msg['id']):
+                    show_sent(new_msg)
+            note_delivered(relevant)
+            renderer.extend(chat_messages.add(relevant))
+            # Someone reading older messages isn't pulled away from them.
+            follow_latest = follow_latest or (at_bottom and not renderer.has_newer)
+            search_index_for(target_user_id).add(relevant)
+            load_visible_thumbnails()
+
+    scheduler.add_before_flush(apply_incoming)
+    scheduler.add_after_flush(scroll_to_latest)
+
+    # --- Inbox ---
+
+    inbox_events = EventQueue()
+
+    def render_contact(email, tile=None):
+        """Builds (or refreshes) a contact tile, with its inbox summary in inbox mode."""
+        if tile is None:
+            tile = ft.ListTile(
+                leading=ft.Icon(ft.Icons.PERSON_OUTLINE),
+                title=ft.Text(email),
+                on_click=lambda _, c=email: page.run_task(start_chat_with_contact, c)
+            )
+        peer_id = directory.lookup(email)
+        summary = inbox.get(peer_id) if inbox_switch.value and peer_id else None
+        tile.subtitle = None
+        tile.trailing = None
+        if summary is not None and summary.last_content is not None:
+            prefix = "You: " if summary.last_sender_id == user_id else ""
+            tile.subtitle = ft.Text(prefix + summary.last_content, max_lines=1, overflow=ft.TextOverflow.ELLIPSIS)
+        if summary is not None and summary.unread:
+            tile.trailing = ft.CircleAvatar(content=ft.Text(str(summary.unread), size=12), radius=12, bgcolor=ft.Colors.BLUE)
+        return tile
+
+    def recent_first(emails):
+        """Orders contacts by their last message, newest first, in inbox mode."""
+        if not inbox_switch.value:
+            return emails
+
+        def last_activity(email):
+            summary = inbox.get(directory.lookup(email))
+            return (summary.last_created_at or "") if summary else ""
+
+        return sorted(emails, key=last_activity, reverse=True)
+
+    def show_contacts(emails):
+        contact_tiles.clear()
+        contacts_list_view.controls.clear()
+        for email in recent_first(emails):
+            tile = render_contact(email)
+            tile.data = email
+            peer_id = directory.lookup(email)
+            if peer_id:
+                contact_tiles[peer_id] = tile
+            contacts_list_view.controls.append(tile)
+        scheduler.request(contacts_list_view)
+
+    def on_inbox_message(row):
+        """Realtime callback for all of the user's messages. Queued like chat messages."""
+        inbox_events.put(row)
+        scheduler.request(contacts_list_view)
+
+    @instrument("chat.apply_inbox_events")
+    def apply_inbox_events():
+        """Folds queued messages into the inbox and refreshes only the affected tiles."""
+        batch = inbox_events.drain()
+        if inbox_events.overflowed:
+            inbox_events.overflowed = False
+            page.run_task(load_contacts)
+        for new_msg in batch:
+            summary = inbox.apply(new_msg)
+            tile = contact_tiles.get(summary.peer_id)
+            if tile is None:
+                continue
+            render_contact(tile.data, tile)
+            if inbox_switch.value:
+                contacts_list_view.controls.remove(tile)
+                contacts_list_view.controls.insert(0, tile)
+        if batch and inbox.active_peer and any(m['sender_id'] == inbox.active_peer for m in batch):
+            page.run_task(mark_conversation_read, inbox.active_peer)
+
+    scheduler.add_before_flush(apply_inbox_events)
+
+    async def mark_conversation_read(peer_id):
+        try:
+            await inbox.mark_read(supabase, peer_id)
+        except Exception as e:
+            print(f"Error marking conversation read: {e}")
+        tile = contact_tiles.get(peer_id)
+        if tile is not None:
+            render_contact(tile.data, tile)
+            scheduler.request(contacts_list_view)
+
+    async def refresh_inbox(since=None):
+        """Reloads every summary in one call once realtime recovers from a drop."""
+        try:
+            await inbox.load(supabase)
+        except Exception as e:
+            print(f"Error loading inbox: {e}")
+            return
+        show_contacts([tile.data for tile in contacts_list_view.controls])
+
+    def on_inbox_switch_change(e):
+        show_contacts([tile.data for tile in contacts_list_view.controls])
+
+    inbox_switch.on_change = on_inbox_switch_change
+
+    @instrument("chat.load_messages")
+    async def load_messages(target_user_id=None):
+        """
+        Shows the cached tail of a chat immediately, then fetches only what is
+        newer than the cache's synced cursor. Chats never synced load their
+        newest page instead.
+        """
+        nonlocal has_older_messages, server_cursor
+        target_user_id = target_user_id or current_chat_partner_uuid
         if not target_user_id:
             return
+        server_cursor = None
 
         try:
-            # Query 1: Messages sent by you to the target
-            response1 = supabase.table("messages").select("*").match({
-                "sender_id": user_id,
-                "receiver_id": target_user_id
-            }).execute()
-
-            # Query 2: Messages sent by the target to you
-            response2 = supabase.table("messages").select("*").match({
-                "sender_id": target_user_id,
-                "receiver_id": user_id
-            }).execute()
-            
-            # Combine the data from both responses
-            all_data = (response1.data or []) + (response2.data or [])
+            cached = await asyncio.to_thread(message_cache.latest, target_user_id, PAGE_SIZE)
+            synced = await asyncio.to_thread(message_cache.synced_through, target_user_id)
+        except Exception as e:
+            print(f"Error reading cached messages: {e}")
+            cached, synced = [], None
+        if target_user_id != current_chat_partner_uuid:
+            return  # Another chat was opened while the cache was read.
+        chat_messages.reset(cached)
+        if cached:
+            has_older_messages = True
+            update_message_list()
 
-            # Sort the combined list by the 'created_at' timestamp
-            # This ensures the chat is in the correct chronological order
-            chat_messages = sorted(all_data, key=lambda msg: msg['created_at'])
-            
+        try:
+            if synced:
+                fetched = await fetch_since(supabase, user_id, target_user_id, after=synced)
+            else:
+                fetched = await fetch_page(supabase, user_id, target_user_id)
+                has_older_messages = bool(cached) or len(fetched) == PAGE_SIZE
+            await asyncio.to_thread(message_cache.upsert, target_user_id, fetched)
+            # Everything up to `synced` was cached already, the rest was just fetched.
+            server_cursor = synced
+            note_delivered(fetched)
+            if server_cursor:
+                await asyncio.to_thread(message_cache.mark_synced, target_user_id, server_cursor)
         except Exception as e:
             print(f"An error occurred loading messages: {e}")
-            chat_messages = []
-        
-        update_message_list()
+            fetched = []
+
+        # Realtime may have delivered some of these while we were fetching;
+        # the store skips ids it already holds.
+        chat_messages.add(fetched)
+        if fetched or not cached:
+            update_message_list()
+        search_index_for(target_user_id).add(fetched)
+        page.run_task(index_conversation, target_user_id)
+
+    async def index_conversation(peer_id):
+        """Indexes the newest cached messages of a conversation once, off the event loop."""
+        if peer_id in indexed_peers:
+            return
+        index = search_index_for(peer_id)
+        indexed_peers.add(peer_id)
+        try:
+            rows = await asyncio.to_thread(message_cache.latest, peer_id, index.capacity)
+            await asyncio.to_thread(index.add, rows)
+        except Exception as e:
+            indexed_peers.discard(peer_id)
+            print(f"Error indexing messages: {e}")
+
+    @instrument("chat.load_older_messages")
+    async def load_older_messages():
+        """Mounts the history just above the rendered window, fetching a page if needed."""
+        nonlocal has_older_messages, loading_older
+        target_user_id = current_chat_partner_uuid
+        oldest = renderer.oldest
+        if loading_older or not target_user_id or oldest is None:
+            return
+
+        # Messages already in memory but recycled out of the window come first.
+        in_memory = chat_messages.before(oldest.cursor, PAGE_SIZE)
+        if in_memory:
+            renderer.prepend(in_memory)
+            return
+        if not has_older_messages:
+            return
 
-    def send_message(e):
-        """Inserts a new message into the Supabase table."""
-        target_user_id = target_id_input.value.strip()
+        loading_older = True
+        try:
+            # Evicted or never-loaded history spills over to the cache, then the server.
+            older = await asyncio.to_thread(message_cache.before, target_user_id, oldest.cursor, PAGE_SIZE)
+            if not older:
+                older = await fetch_page(supabase, user_id, target_user_id, before=oldest.cursor)
+                has_older_messages = len(older) == PAGE_SIZE
+                await asyncio.to_thread(message_cache.upsert, target_user_id, older)
+            renderer.prepend(chat_messages.add_older(older))
+            search_index_for(target_user_id).add(older)
+        except Exception as e:
+            print(f"An error occurred loading older messages: {e}")
+        finally:
+            loading_older = False
+
+    def load_newer_messages():
+        """Mounts the messages just below a window that was trimmed while paging back."""
+        newest = renderer.newest
+        if newest is None or not renderer.has_newer:
+            return
+        newer = chat_messages.after(newest.cursor, PAGE_SIZE + 1)
+        if not newer:
+            update_message_list()
+            return
+        renderer.extend_newer(newer[:PAGE_SIZE], more=len(newer) > PAGE_SIZE)
+        load_visible_thumbnails()
+
+    async def on_message_list_scroll(e: ft.OnScrollEvent):
+        """Loads thumbnails coming into view and pages history in at either end."""
+        nonlocal scroll_position, at_bottom
+        scroll_position = (e.pixels, e.max_scroll_extent, e.viewport_dimension)
+        at_bottom = e.max_scroll_extent - e.pixels < 50
+        load_visible_thumbnails()
+        if e.pixels <= e.min_scroll_extent:
+            await load_older_messages()
+        elif e.pixels >= e.max_scroll_extent:
+            load_newer_messages()
+
+    @instrument("chat.send_message")
+    async def send_message(e):
+        """Shows the message right away as pending and queues it in the outbox."""
+        nonlocal follow_latest
+        target_user_id = current_chat_partner_uuid
         if not target_user_id:
             page.open(ft.SnackBar(ft.Text("Please connect to a user first.")))
-            page.update()
+            scheduler.request()
             return
             
         content = input_message.value.strip()
         if not content:
             return
 
-        # CORRECTED: Removed `created_at`. Let the database handle the timestamp.
-        data_to_insert = {
-            "sender_id": user_id,
-            "receiver_id": target_user_id,
-            "content": content,
-        }
-        
-        # CORRECTED: Added .execute() to run the query.
-        response = supabase.table("messages").insert(data_to_insert).execute()
-        
-        if hasattr(response, 'error') and response.error:
-            page.open(ft.SnackBar(ft.Text(f"Error sending message: {response.error.message}")))
-            page.update()
+        # The id is generated here so the realtime echo can be matched to this row.
+        row = new_message(user_id, target_user_id, content)
+        input_message.value = ""
+        outbox.put(row)
+        added = chat_messages.add([row])
+        if renderer.has_newer:
+            # Scrolled back through history: jump to the latest to show the message.
+            update_message_list()
         else:
-            # The Realtime listener will add the message to the UI, so no manual refresh is needed.
-            input_message.value = ""
-        
-        page.update()
+            renderer.extend(added)
+            follow_latest = True
+        search_index_for(target_user_id).add([row])
+        scheduler.request(input_message)
+
+    # --- Attachments ---
+
+    def load_visible_thumbnails():
+        """Starts fetching thumbnails for the attachments on (or about to come on) screen."""
+        for msg in renderer.visible(*(scroll_position or ())):
+            if not msg['attachment']:
+                continue
+            control = renderer.get(msg['id'])
+            if isinstance(control, ft.Column) and control.controls[1].data is None:
+                control.controls[1].data = "loading"
+                page.run_task(load_thumbnail, control, msg['id'], thumbnail_path(msg['attachment'], msg['sender_id']))
+
+    async def load_thumbnail(control, message_id, key):
+        try:
+            src = await thumbnail(key, lambda: download(supabase, key))
+        except Exception as e:
+            print(f"Error loading thumbnail: {e}")
+            if control.data == message_id:
+                control.controls[1].data = "failed"
+            return
+        if control.data != message_id:
+            return  # Recycled for another message meanwhile.
+        slot = control.controls[1]
+        slot.content, slot.data = ft.Image(src_base64=src, fit=ft.ImageFit.CONTAIN), "loaded"
+        scheduler.request(slot)
+
+    async def open_attachment(attachment):
+        """Opens the full file through a short-lived signed link."""
+        try:
+            url = await signed_url(supabase, attachment['path'])
+        except Exception as e:
+            print(f"Error opening attachment: {e}")
+            return
+        page.launch_url(url)
+
+    def on_files_picked(e: ft.FilePickerResultEvent):
+        """Sends picked files; in the browser they are first uploaded to this server."""
+        target_user_id = current_chat_partner_uuid
+        if not e.files or not target_user_id:
+            return
+        to_upload = []
+        for f in e.files:
+            # A browser client could claim any server path, so web sessions always upload.
+            if not page.web and f.path:
+                # Desktop: the file is already on this machine.
+                page.run_task(send_attachment, f.path, f.name, target_user_id)
+            else:
+                # Web: Flet streams it to upload_dir(), one folder per upload.
+                relative = f"{uuid.uuid4().hex}/{safe_name(f.name)}"
+                uploads[relative] = (f.name, target_user_id)
+                to_upload.append(ft.FilePickerUploadFile(f.name, upload_url=page.get_upload_url(relative, 600), id=f.id))
+        if to_upload:
+            file_picker.upload(to_upload)
+
+    def take_upload(name, received):
+        """
+        The oldest upload in flight named `name` (only one whose file has
+        fully arrived if `received`). Upload events only carry the file
+        name, so same-named files are told apart by what is on disk.
+        """
+        for relative, (upload_name, target_user_id) in list(uploads.items()):
+            if upload_name != name:
+                continue
+            try:
+                path = upload_path(relative)
+            except ValueError as error:
+                print(f"Error receiving upload: {error}")
+                uploads.pop(relative, None)
+                continue
+            if received and not os.path.isfile(path):
+                continue
+            uploads.pop(relative, None)
+            return path, target_user_id
+        return None, None
+
+    def on_file_uploaded(e: ft.FilePickerUploadEvent):
+        if e.error:
+            print(f"Error uploading {e.file_name}: {e.error}")
+            take_upload(e.file_name, received=False)
+            return
+        if e.progress is not None and e.progress >= 1:
+            path, target_user_id = take_upload(e.file_name, received=True)
+            if path is not None:
+                page.run_task(send_attachment, path, os.path.basename(path), target_user_id, True)
+
+    @instrument("chat.send_attachment")
+    async def send_attachment(path, name, target_user_id, uploaded=False):
+        """Streams a file to storage, then sends it through the outbox like a text message."""
+        nonlocal follow_latest
+        identity = identity_for(page).identity
+        page.open(ft.SnackBar(ft.Text(f"Uploading {name}…")))
+        scheduler.request()
+        try:
+            if identity is None:
+                return
+            attachment = await send_file(supabase, identity.access_token, user_id, path, name)
+        except Exception as e:
+            print(f"Error sending attachment: {e}")
+            page.open(ft.SnackBar(ft.Text(f"❌ Couldn't upload {name}.")))
+            scheduler.request()
+            return
+        finally:
+            if uploaded:
+                # The browser's copy is in storage now (or failed); don't keep it.
+                try:
+                    await asyncio.to_thread(discard_upload, path)
+                except ValueError as error:
+                    print(f"Error removing upload: {error}")
+
+        row = new_message(user_id, target_user_id, f"📎 {name}", attachment)
+        outbox.put(row)
+        if target_user_id == current_chat_partner_uuid:
+            renderer.extend(chat_messages.add([row]))
+            follow_latest = follow_latest or (at_bottom and not renderer.has_newer)
+            search_index_for(target_user_id).add([row])
+            load_visible_thumbnails()
+
+    file_picker = ft.FilePicker(on_result=on_files_picked, on_upload=on_file_uploaded)
+
+    # --- Search ---
+
+    def show_search(visible: bool):
+        search_results.visible = visible
+        message_list.visible = not visible
+        if not visible:
+            search_older_btn.visible = False
+        scheduler.request()
+
+    @instrument("chat.search_messages")
+    def search_messages(e=None):
+        """Searches the indexed history as the user types."""
+        nonlocal search_position
+        query = search_field.value.strip()
+        search_position = None
+        if not query or not current_chat_partner_uuid:
+            show_search(False)
+            return
+        index = search_index_for(current_chat_partner_uuid)
+        hits = index.search(query, PAGE_SIZE)
+        search_results.controls = [render_message(message) for message in hits]
+        if not hits:
+            search_results.controls.append(ft.Text("No matches in loaded messages.", italic=True))
+        # History older than the index is only on the server.
+        search_older_btn.visible = has_older_messages or index.truncated
+        show_search(True)
+
+    @instrument("chat.search_older_messages")
+    async def search_older_messages(e):
+        """Pages through server-side matches older than anything indexed."""
+        nonlocal search_position
+        peer_id = current_chat_partner_uuid
+        terms = tokenize(search_field.value)
+        if not peer_id or not terms:
+            return
+        before = search_position or search_index_for(peer_id).oldest
+        try:
+            rows = await search_page(supabase, user_id, peer_id, terms, before=before)
+        except Exception as error:
+            print(f"An error occurred searching messages: {error}")
+            return
+        search_results.controls.extend(render_message(Message.from_row(row)) for row in rows)
+        if rows:
+            search_position = cursor(rows[-1])
+        search_older_btn.visible = len(rows) == PAGE_SIZE
+        scheduler.request(search_results, search_older_btn)
+
+    def clear_search():
+        search_field.value = ""
+        show_search(False)
 
     def activate_realtime_listener():
+        """Routes the active conversation's new messages to this session."""
         nonlocal subscription
         if subscription:
-            supabase.remove_subscription(subscription)
+            hub.unsubscribe(subscription)
+            subscription = None
 
-        subscription = supabase.realtime.channel("public:messages").on(
-            "postgres_changes",
-            {"event": "INSERT", "schema": "public", "table": "messages"},
-            on_new_message
-        ).subscribe()
+        if current_chat_partner_uuid:
+            subscription = hub.subscribe(
+                supabase, user_id, current_chat_partner_uuid, on_new_message,
+                on_resync=lambda since: page.run_task(fill_gap, since),
+            )
 
-    def add_contact(e):
-        """Saves a new contact's email to the Supabase 'contacts' table."""
-        contact_email = new_contact_input.value.strip().lower()
-        if not contact_email:
+    @instrument("chat.fill_gap")
+    async def fill_gap(since=None):
+        """
+        Fetches only the messages sent while realtime was down, starting after
+        the newest one the server delivered, and queues them like live ones;
+        the store drops any that did arrive. Our own sends don't count: one
+        stored during the outage is newer than the peer messages we missed.
+        """
+        # Back online: give messages that ran out of retries another go.
+        outbox.retry_failed()
+        target_user_id = current_chat_partner_uuid
+        if not target_user_id:
+            return
+        positions = [p for p in (since, server_cursor) if p]
+        if not positions:
+            await load_messages()
             return
-
         try:
-            # Check if contact already exists
-            existing = supabase.table("contacts").select("id").match({"user_id": user_id, "contact_email": contact_email}).execute()
-            if not existing.data:
-                supabase.table("contacts").insert({ "user_id": user_id, "contact_email": contact_email }).execute()
-                page.snack_bar = ft.SnackBar(ft.Text("✅ Contact saved!"))
-                load_contacts()
-                new_contact_input.value = ""
-            else:
-                page.snack_bar = ft.SnackBar(ft.Text("ℹ️ Contact already exists."))
-
-        except Exception as ex:
-            page.snack_bar = ft.SnackBar(ft.Text(f"Error saving contact: {ex}"))
-        
-        page.snack_bar.open = True
-        page.update()
+            fetched = await fetch_since(supabase, user_id, target_user_id, after=max(positions))
+        except Exception as e:
+            print(f"An error occurred filling the realtime gap: {e}")
+            return
+        for row in fetched:
+            incoming.put(row)
+        if fetched:
+            scheduler.request(message_list)
 
-    def connect_to_chat(e):
+    @instrument("chat.connect_to_chat")
+    async def connect_to_chat(e):
         """Connects to a chat, loads history, and subscribes to real-time updates."""
-        nonlocal subscription
-        target_user_id = target_id_input.value.strip()
+        target_user_id = current_chat_partner_uuid
         if not target_user_id:
             page.open(ft.SnackBar(ft.Text("Please enter a Target User ID.")))
-            page.update()
+            scheduler.request()
             return
         
-        # Unsubscribe from any previous chat channel to prevent multiple listeners
-        if subscription:
-            supabase.remove_subscription(subscription)
+        # Give messages that ran out of retries another go
+        outbox.retry_failed()
 
         # Load initial message history for the new chat
-        load_messages()
+        await load_messages()
 
-        # Set up a new Realtime subscription for the current chat
-        subscription = supabase.realtime.channel("public:messages").on(
-            "postgres_changes",
-            {"event": "INSERT", "schema": "public", "table": "messages"},
-            on_new_message
-        ).subscribe()
+        # Replace any previous chat's listener with one for the current chat
+        activate_realtime_listener()
 
         page.open(ft.SnackBar(ft.Text(f"✅ Chatting with user {target_user_id[:8]}...")))
-        page.update()
+        scheduler.request()
 
     ## NEW: Contact Management Functions
-    def add_contact(e):
-        """Saves a new contact's UUID to the Supabase 'contacts' table."""
-        contact_id = new_contact_id_input.value.strip()
-        if not contact_id:
+    @instrument("chat.add_contact")
+    async def add_contact(e):
+        """Saves a new contact's email to the Supabase 'contacts' table."""
+        contact_email = new_contact_id_input.value.strip().lower()
+        if not contact_email:
             # You can add a snackbar here for feedback
             return
 
         try:
             # Check if contact already exists to avoid duplicates
-            existing = supabase.table("contacts").select("id").match({"user_id": user_id, "contact_uuid": contact_id}).execute()
+            existing = await execute(supabase.table("contacts").select("id").match({"user_id": user_id, "contact_email": contact_email}), "contacts.exists")
             if not existing.data:
-                supabase.table("contacts").insert({
+                await execute(supabase.table("contacts").insert({
                     "user_id": user_id,
-                    "contact_uuid": contact_id
-                }).execute()
+                    "contact_email": contact_email
+                }), "contacts.insert")
+                # Drop any stale lookup (e.g. the account didn't exist yet) before refreshing.
+                directory.invalidate(contact_email)
                 page.open(ft.SnackBar(ft.Text("✅ Contact saved!")))
-                load_contacts() # Refresh the list
+                await load_contacts() # Refresh the list
                 new_contact_id_input.value = ""
             else:
                 page.open(ft.SnackBar(ft.Text("ℹ️ Contact already exists.")))
@@ -221,91 +766,146 @@ def chat_view(page: ft.Page, supabase, user_id: str):
         except Exception as e:
             page.snack_bar = ft.SnackBar(ft.Text(f"Error saving contact: {e}"))
 
-        page.update()
+        scheduler.request()
+
+    @instrument("chat.load_contacts")
+    async def load_contacts():
+        """
+        Loads the user's saved contacts into the drawer. The contact list and
+        the inbox summaries are fetched together and the contacts resolved in
+        one batch, so this is three round trips however many contacts there are.
+        """
+        async def load_inbox():
+            try:
+                await inbox.load(supabase)
+            except Exception as e:
+                # The drawer still works as a plain contact list.
+                print(f"Error loading inbox: {e}")
 
-    def load_contacts():
-        """Loads the user's saved contacts from Supabase into the drawer."""
-        contacts_list_view.controls.clear()
         try:
-            response = supabase.table("contacts").select("contact_uuid").eq("user_id", user_id).execute()
-            if response.data:
-                for contact in response.data:
-                    email = contact['contact_email']
-                    contacts_list_view.controls.append(
-                        ft.ListTile(
-                            leading=ft.Icon(ft.icons.PERSON_OUTLINE),
-                            title=ft.Text(email),
-                            on_click=lambda _, c=email: start_chat_with_contact(c)
-                        )
-                    )
+            response, _ = await asyncio.gather(
+                execute(supabase.table("contacts").select("contact_email").eq("user_id", user_id), "contacts.select"),
+                load_inbox(),
+            )
+            emails = [contact['contact_email'] for contact in response.data or []]
+            try:
+                # Warms the shared directory so clicking a contact needs no RPC.
+                await directory.resolve_many(supabase, emails)
+            except Exception as e:
+                # Still list the contacts; each one resolves on click instead.
+                print(f"Error resolving contacts: {e}")
+            show_contacts(emails)
         except Exception as e:
             print(f"Error loading contacts: {e}") # Print error to console
-        page.update()
+        scheduler.request()
 
-    def start_chat_with_contact(contact_email: str):
-        """Finds a contact's UUID via RPC and loads the chat with them."""
+    @instrument("chat.start_chat_with_contact")
+    async def start_chat_with_contact(contact_email: str):
+        """Loads the chat with a contact, resolving their UUID only if it isn't cached."""
         nonlocal current_chat_partner_uuid
         page.end_drawer.open = False
         page.snack_bar = ft.SnackBar(ft.Text(f"Loading chat with {contact_email}..."))
         page.snack_bar.open = True
-        page.update()
+        scheduler.request()
 
         try:
-            # Use the RPC function we created to get the UUID from the email
-            response = supabase.rpc('get_uuid_from_email', {'email_to_find': contact_email}).execute()
-            target_uuid = response.data
+            target_uuid = await directory.resolve(supabase, contact_email)
             
             if not target_uuid:
-                page.snack_bar = ft.SnackBar(ft.Text("❌ User not found. Please check the email.", bgcolor=ft.colors.ERROR))
+                page.snack_bar = ft.SnackBar(ft.Text("❌ User not found. Please check the email.", bgcolor=ft.Colors.ERROR))
                 page.snack_bar.open = True
-                page.update()
+                scheduler.request()
                 return
 
             # Set the global chat partner UUID
             current_chat_partner_uuid = target_uuid
+            inbox.active_peer = target_uuid
+            clear_search()
             # Update the app bar title
             chat_app_bar_title.value = f"Chat with {contact_email}"
             # Load the message history
-            load_messages(target_uuid)
+            await load_messages(target_uuid)
+            activate_realtime_listener()
+            await mark_conversation_read(target_uuid)
             
         except Exception as e:
             print(f"Error starting chat: {e}")
-            page.snack_bar = ft.SnackBar(ft.Text("An error occurred.", bgcolor=ft.colors.ERROR))
+            page.snack_bar = ft.SnackBar(ft.Text("An error occurred.", bgcolor=ft.Colors.ERROR))
             page.snack_bar.open = True
-            page.update()
+            scheduler.request()
 
     # --- Cleanup ---
     
-    def cleanup_on_exit(e):
-        """Unsubscribe from Realtime events when the view is closed."""
-        nonlocal subscription
+    def dispose():
+        """Unsubscribes from Realtime events once the cached view is invalidated."""
+        nonlocal subscription, inbox_subscription
         if subscription:
-            supabase.remove_subscription(subscription)
-    
-    page.on_view_pop = cleanup_on_exit
-    page.on_disconnect = cleanup_on_exit
+            hub.unsubscribe(subscription)
+            subscription = None
+        if inbox_subscription:
+            hub.unsubscribe(inbox_subscription)
+            inbox_subscription = None
+        scheduler.remove_before_flush(apply_incoming)
+        scheduler.remove_before_flush(apply_inbox_events)
+        scheduler.remove_after_flush(scroll_to_latest)
+        if file_picker in page.overlay:
+            page.overlay.remove(file_picker)
+        message_cache.close()
 
     # --- Button and Input Event Handlers ---
+    message_list.on_scroll = on_message_list_scroll
+    search_field.on_change = search_messages
+    search_older_btn.on_click = search_older_messages
+    input_message.on_submit = send_message
     send_btn = ft.ElevatedButton("Send", on_click=send_message)
+    attach_btn = ft.IconButton(
+        ft.Icons.ATTACH_FILE,
+        on_click=lambda _: file_picker.pick_files(allow_multiple=True),
+        tooltip="Attach files",
+    )
     connect_btn = ft.ElevatedButton("connect/refresh", on_click=connect_to_chat)
 
     ## NEW: Function to open the right-side drawer
     def open_drawer(e):
         current_view = page.views[-1]   # last view in stack
         current_view.end_drawer.open = True
-        page.update()
+        scheduler.request()
+
+    async def load_qr_code():
+        """Renders the QR code in a worker thread and swaps out the placeholder."""
+        try:
+            src = await asyncio.to_thread(generate_qr_code, user_id)
+        except Exception as e:
+            print(f"Error generating QR code: {e}")
+            return
+        qr_img.content = ft.Image(src=src, width=150, height=150)
+        scheduler.request(qr_img)
+
+    async def load_initial_data():
+        """Runs the independent view-open requests concurrently."""
+        await asyncio.gather(load_contacts(), load_messages())
 
     ## MODIFIED: Initial data loading
-    load_contacts()
+    page.overlay.append(file_picker)
+    page.run_task(load_initial_data)
+    if not qr_src:
+        page.run_task(load_qr_code)
     activate_realtime_listener()
+    inbox_subscription = hub.subscribe(
+        supabase, user_id, None, on_inbox_message,
+        on_resync=lambda since: page.run_task(refresh_inbox, since),
+    )
     ## MODIFIED: The main layout is simplified, moving the user ID card to the drawer.
-    return ft.View(
+    view = ft.View(
         "/chat",
         controls=[
             ft.Column(
                 controls=[
+                    search_field,
                     message_list,
-                    ft.Row([input_message, send_btn]),
+                    search_results,
+                    search_older_btn,
+                    ft.Row([attach_btn, input_message, send_btn]),
                 ],
                 expand=True,
             )
@@ -319,7 +919,12 @@ def chat_view(page: ft.Page, supabase, user_id: str):
                     ft.Icons.PERSON,
                     on_click=open_drawer,
                     tooltip="My Info & Contacts"
-                )
+                ),
+                ft.IconButton(
+                    ft.Icons.LOGOUT,
+                    on_click=lambda _: page.run_task(logout, page, supabase),
+                    tooltip="Log out"
+                ),
             ]
         ),
         padding=20,
@@ -345,8 +950,15 @@ def chat_view(page: ft.Page, supabase, user_id: str):
                     ])
                 ),
                 ft.Divider(),
-                ft.Text("My Contacts", weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER),
+                ft.Row(
+                    [ft.Text("My Contacts", weight=ft.FontWeight.BOLD), inbox_switch],
+                    alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                ),
                 contacts_list_view,
             ],
         )
-    )
\ No newline at end of file
+    )
+
+    # Kept alive across route changes and reconnects until logout or session close (see main.py).
+    view_cache_for(page).put("/chat", user_id, view, dispose=dispose)
+    return view
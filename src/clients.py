@@ -0,0 +1,60 @@
+import os
+import threading
+
+
+def _env_number(name: str, default, cast=int):
+    value = os.environ.get(name)
+    return cast(value) if value else default
+
+
+class ClientFactory:
+    """
+    Creates one async Supabase client per Flet session.
+
+    Only the async client supports realtime (the sync client's
+    `realtime.channel()` raises NotImplementedError), so there is no sync mode.
+
+    Each client keeps its own auth state, so signing in on one session never
+    changes what another session is authorized as. All clients share a
+    single keep-alive HTTP connection pool, so connection reuse survives
+    and the number of open sockets is bounded by the pool limits rather than
+    by the number of sessions.
+
+    Limits default to SUPABASE_POOL_MAX_CONNECTIONS (100),
+    SUPABASE_POOL_MAX_KEEPALIVE (the connection limit) and
+    SUPABASE_POOL_KEEPALIVE_EXPIRY (30 seconds). Keeping fewer connections
+    alive than may be open makes a busy pool reconnect for most requests.
+    """
+
+    def __init__(self, url: str, key: str, max_connections: int = None, max_keepalive: int = None, keepalive_expiry: float = None):
+        self.url = url
+        self.key = key
+        self.max_connections = max_connections or _env_number("SUPABASE_POOL_MAX_CONNECTIONS", 100)
+        self.max_keepalive = max_keepalive or _env_number("SUPABASE_POOL_MAX_KEEPALIVE", self.max_connections)
+        self.keepalive_expiry = keepalive_expiry or _env_number("SUPABASE_POOL_KEEPALIVE_EXPIRY", 30.0, float)
+        self._lock = threading.Lock()
+        self._http = None
+
+    def http_client(self):
+        """The shared httpx.AsyncClient behind every session's Supabase client."""
+        with self._lock:
+            if self._http is None:
+                import httpx
+
+                limits = httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry,
+                )
+                self._http = httpx.AsyncClient(limits=limits)
+            return self._http
+
+    async def create(self):
+        """
+        A new client with its own auth session on top of the shared pool.
+        Token refresh is left to the session identity (see identity.py).
+        """
+        from supabase import AsyncClientOptions, acreate_client
+
+        options = AsyncClientOptions(httpx_client=self.http_client(), auto_refresh_token=False)
+        return await acreate_client(self.url, self.key, options=options)
@@ -0,0 +1,382 @@
+"""
+Multi-worker mode: N Flet worker processes behind one port.
+
+The parent process accepts every connection on the public port and hands
+the socket itself to a worker chosen by hashing the client's IP (over a
+Unix socket, with `multiprocessing.reduction.send_handle`), so a browser
+keeps talking to the worker that holds its session. From then on the
+worker and the browser talk directly: the parent never touches the bytes
+of a connection, and workers see the client's real address. The parent also owns
+the only realtime connection: workers forward their channel subscriptions
+to it over a `multiprocessing` Pipe, and it relays each event once to the
+workers subscribed to that channel, batched per event-loop tick.
+
+Inside a worker, `BrokerClient` stands in for the Supabase client's
+realtime API, so `RealtimeHub` routes events exactly as in single-process
+mode.
+"""
+import asyncio
+import functools
+import inspect
+import itertools
+import multiprocessing
+import os
+import socket
+import threading
+import zlib
+from multiprocessing import reduction
+
+
+def _status_name(status) -> str:
+    return getattr(status, "value", status)
+
+
+# --- Worker side ---
+
+class BrokerChannel:
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+        self.bindings = []
+        self.status_callback = None
+
+    def on_postgres_changes(self, event: str, callback, table: str = None, schema: str = None, filter: str = None):
+        self.bindings.append(({"event": event, "table": table, "schema": schema, "filter": filter}, callback))
+        return self
+
+    def subscribe(self, callback=None):
+        self.status_callback = callback
+        self.client._register(self)
+        return self
+
+
+class BrokerClient:
+    """The realtime surface of a Supabase client, served by the parent's broker."""
+
+    def __init__(self, conn):
+        self.realtime = self
+        self._conn = conn
+        self._send_lock = threading.Lock()
+        self._channels = {}
+        threading.Thread(target=self._read, name="broker-client", daemon=True).start()
+
+    def channel(self, name: str) -> BrokerChannel:
+        return BrokerChannel(self, name)
+
+    def remove_channel(self, channel):
+        if self._channels.get(channel.name) is channel:
+            del self._channels[channel.name]
+            self._send(("unsubscribe", channel.name))
+
+    def _register(self, channel):
+        self._channels[channel.name] = channel
+        self._send(("subscribe", channel.name, [spec for spec, _ in channel.bindings]))
+
+    def _send(self, message):
+        with self._send_lock:
+            self._conn.send(message)
+
+    def _read(self):
+        while True:
+            try:
+                message = self._conn.recv()
+            except (EOFError, OSError):
+                return
+            if message[0] == "events":
+                for name, index, payload in message[1]:
+                    channel = self._channels.get(name)
+                    if channel is not None:
+                        channel.bindings[index][1](payload)
+            elif message[0] == "status":
+                channel = self._channels.get(message[1])
+                if channel is not None and channel.status_callback is not None:
+                    channel.status_callback(message[2], None)
+
+
+# --- Parent side ---
+
+def _topic_key(specs) -> tuple:
+    return tuple(tuple(sorted(spec.items())) for spec in specs)
+
+
+class _Topic:
+    __slots__ = ("channel", "workers", "status")
+
+    def __init__(self):
+        self.channel = None
+        self.workers = {}   # worker connection -> names of its channels bound to this topic
+        self.status = None
+
+
+class Broker:
+    """
+    Opens each realtime channel once on behalf of every worker subscribed
+    to it and relays its events and status changes to them. Worker
+    channels with the same bindings (e.g. the same user's channel in two
+    workers) share one channel here, whatever the workers named them.
+    """
+
+    def __init__(self, client, loop):
+        self.client = client
+        self.loop = loop
+        self._topics = {}   # binding key -> _Topic
+        self._names = {}    # (worker connection, channel name) -> binding key
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_scheduled = False
+
+    def attach(self, conn):
+        self._pending[conn] = []
+        self.loop.add_reader(conn.fileno(), self._on_readable, conn)
+
+    def detach(self, conn):
+        self.loop.remove_reader(conn.fileno())
+        self._pending.pop(conn, None)
+        for key in [key for key, topic in self._topics.items() if conn in topic.workers]:
+            self._topics[key].workers.pop(conn)
+            self._close_if_unused(key)
+        for worker, name in [entry for entry in self._names if entry[0] is conn]:
+            del self._names[(worker, name)]
+
+    def _on_readable(self, conn):
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            self.detach(conn)
+            return
+        if message[0] == "subscribe":
+            self._subscribe(conn, message[1], message[2])
+        elif message[0] == "unsubscribe":
+            self._unsubscribe(conn, message[1])
+
+    def _subscribe(self, conn, name: str, specs):
+        key = _topic_key(specs)
+        topic = self._topics.get(key)
+        created = topic is None
+        if created:
+            topic = self._topics[key] = _Topic()
+            channel = self.client.realtime.channel(f"broker:{next(self._ids)}")
+            for index, spec in enumerate(specs):
+                channel.on_postgres_changes(
+                    spec["event"],
+                    table=spec["table"],
+                    schema=spec["schema"],
+                    filter=spec["filter"],
+                    callback=lambda payload, index=index: self._relay(key, index, payload),
+                )
+            topic.channel = channel
+        self._names[(conn, name)] = key
+        topic.workers.setdefault(conn, set()).add(name)
+        if created:
+            self._run(topic.channel.subscribe(lambda status, err=None: self._on_status(topic, key, status)))
+        elif topic.status is not None:
+            # Already live: tell the newcomer so its hub sees the same states.
+            self._send(conn, ("status", name, topic.status))
+
+    def _unsubscribe(self, conn, name: str):
+        key = self._names.pop((conn, name), None)
+        topic = self._topics.get(key)
+        if topic is None or name not in topic.workers.get(conn, ()):
+            return
+        topic.workers[conn].discard(name)
+        if not topic.workers[conn]:
+            del topic.workers[conn]
+        self._close_if_unused(key)
+
+    def _close_if_unused(self, key):
+        topic = self._topics.get(key)
+        if topic is not None and not topic.workers:
+            del self._topics[key]
+            self._run(self.client.realtime.remove_channel(topic.channel))
+
+    def _on_status(self, topic, key, status):
+        status = _status_name(status)
+        if self._topics.get(key) is not topic:
+            return
+        if status == "SUBSCRIBED":
+            topic.status = status
+        else:
+            # Drop the dead channel now; each worker's hub reconnects with backoff
+            # and the first one back opens a fresh channel.
+            del self._topics[key]
+            self._run(self.client.realtime.remove_channel(topic.channel))
+        for conn, names in list(topic.workers.items()):
+            for name in list(names):
+                self._send(conn, ("status", name, status))
+
+    def _relay(self, key, index: int, payload):
+        topic = self._topics.get(key)
+        if topic is None:
+            return
+        with self._lock:
+            for conn, names in topic.workers.items():
+                for name in names:
+                    self._pending[conn].append((name, index, payload))
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self.loop.call_soon_threadsafe(self.flush)
+
+    def flush(self):
+        """Sends every worker its queued events in one message."""
+        with self._lock:
+            self._flush_scheduled = False
+            batches = [(conn, events) for conn, events in self._pending.items() if events]
+            for conn, _ in batches:
+                self._pending[conn] = []
+        for conn, events in batches:
+            self._send(conn, ("events", events))
+
+    def _send(self, conn, message):
+        try:
+            conn.send(message)
+        except (BrokenPipeError, OSError) as e:
+            print(f"Error relaying to worker: {e}")
+
+    def _run(self, result):
+        if inspect.isawaitable(result):
+            asyncio.ensure_future(result)
+
+
+# --- Connection hand-off ---
+
+def worker_for(address: str, count: int) -> int:
+    """The worker index a client address is pinned to."""
+    return zlib.crc32(address.encode()) % count
+
+
+async def accept_connections(listener, handles, pids):
+    """
+    Accepts connections on `listener` and hands each socket to the worker
+    its client's IP is pinned to, over that worker's `handles` connection.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        sock, address = await loop.sock_accept(listener)
+        index = worker_for(address[0] if address else "", len(handles))
+        try:
+            reduction.send_handle(handles[index], sock.fileno(), pids[index])
+        except OSError as e:
+            print(f"Error handing a connection to worker {index}: {e}")
+        finally:
+            # The worker holds its own descriptor now.
+            sock.close()
+
+
+def receive_connections(handles, loop, protocol_factory):
+    """Serves every socket the parent hands over `handles` with `protocol_factory` on `loop`."""
+    async def adopt(sock):
+        try:
+            await loop.connect_accepted_socket(protocol_factory, sock)
+        except OSError as e:
+            print(f"Error adopting a connection: {e}")
+            sock.close()
+
+    def receive():
+        while True:
+            try:
+                fd = reduction.recv_handle(handles)
+            except (EOFError, OSError):
+                return
+            sock = socket.socket(fileno=fd)
+            sock.setblocking(False)
+            asyncio.run_coroutine_threadsafe(adopt(sock), loop)
+
+    threading.Thread(target=receive, name="connection-handoff", daemon=True).start()
+
+
+# --- Entry points ---
+
+async def _serve_worker(app_main, handles):
+    import flet as ft
+    import uvicorn
+
+    from attachments import upload_dir
+
+    # Flet's web server is this ASGI app served by uvicorn (flet-web). The
+    # worker has no listening socket: uvicorn runs without one, and each
+    # connection the parent hands over gets uvicorn's HTTP/WebSocket protocol.
+    app = ft.app(target=app_main, export_asgi_app=True, upload_dir=upload_dir())
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    serving = asyncio.create_task(server.serve(sockets=[]))
+    while not server.started:
+        if serving.done():
+            return await serving
+        await asyncio.sleep(0.05)
+    config = server.config
+    protocol = functools.partial(
+        config.http_protocol_class, config=config, server_state=server.server_state, app_state=server.lifespan.state
+    )
+    receive_connections(handles, asyncio.get_running_loop(), protocol)
+    await serving
+
+
+def _worker_main(app_main, handles, conn):
+    from realtime_hub import hub
+
+    hub.use_client(BrokerClient(conn))
+    asyncio.run(_serve_worker(app_main, handles))
+
+
+async def _create_realtime_client():
+    from supabase import acreate_client
+
+    # The broker subscribes on behalf of every user, so it needs a key that
+    # can see all messages (the service role key) when RLS is enabled.
+    key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ["SUPABASE_KEY"]
+    return await acreate_client(os.environ["SUPABASE_URL"], key)
+
+
+async def _serve(host: str, port: int, processes, handles, conns):
+    loop = asyncio.get_running_loop()
+    broker = Broker(await _create_realtime_client(), loop)
+    for conn in conns:
+        broker.attach(conn)
+    with socket.create_server((host, port), backlog=1024) as listener:
+        listener.setblocking(False)
+        print(f"Serving {len(processes)} workers on http://{host}:{port}")
+        await accept_connections(listener, handles, [process.pid for process in processes])
+
+
+def start_workers(target, count: int, args_for):
+    """Starts `count` spawned processes running `target(*args_for(index), conn)`; returns (processes, conns)."""
+    context = multiprocessing.get_context("spawn")
+    processes, conns = [], []
+    metrics_port = os.environ.get("CHAT_METRICS_PORT")
+    try:
+        for index in range(count):
+            parent_conn, child_conn = context.Pipe()
+            if metrics_port:
+                # Each worker serves its own metrics on the next ports up.
+                os.environ["CHAT_METRICS_PORT"] = str(int(metrics_port) + 1 + index)
+            process = context.Process(target=target, args=(*args_for(index), child_conn), daemon=True, name=f"chat-worker-{index}")
+            process.start()
+            child_conn.close()
+            processes.append(process)
+            conns.append(parent_conn)
+    finally:
+        if metrics_port:
+            os.environ["CHAT_METRICS_PORT"] = metrics_port
+    return processes, conns
+
+
+def handoff_pipes(count: int):
+    """(parent ends, worker ends) of the Unix socket pairs connections are handed over."""
+    pipes = [multiprocessing.get_context("spawn").Pipe() for _ in range(count)]
+    return [parent for parent, _ in pipes], [child for _, child in pipes]
+
+
+def run(app_main, workers: int, host: str = "0.0.0.0", port: int = 8550):
+    """Serves `app_main` from `workers` processes, all behind `port`."""
+    handles, worker_handles = handoff_pipes(workers)
+    processes, conns = start_workers(_worker_main, workers, lambda index: (app_main, worker_handles[index]))
+    for handle in worker_handles:
+        handle.close()
+    try:
+        asyncio.run(_serve(host, port, processes, handles, conns))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
@@ -0,0 +1,48 @@
+from db import execute
+from ttl_cache import TTLCache
+
+# Cached marker for emails that have no account, so they aren't looked up again.
+_NOT_FOUND = ""
+
+
+class ContactDirectory:
+    """
+    Process-wide email -> user UUID resolution shared by every session.
+
+    A whole contact list is resolved with one batched RPC and kept in a
+    TTL-bounded cache, so starting a chat with a listed contact needs no
+    extra round trip. Requires the `get_uuids_from_emails` function from
+    the README.
+    """
+
+    def __init__(self, ttl: float = 10 * 60, maxsize: int = 10_000):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def lookup(self, email: str):
+        """Cached UUID for `email`, or None if unknown or not resolved yet."""
+        return self._cache.get(email.lower()) or None
+
+    def invalidate(self, email: str):
+        self._cache.pop(email.lower())
+
+    async def resolve_many(self, supabase, emails) -> dict:
+        """Resolves every email not already cached in a single RPC call."""
+        emails = [email.lower() for email in emails]
+        missing = sorted({email for email in emails if email not in self._cache})
+        if missing:
+            response = await execute(supabase.rpc("get_uuids_from_emails", {"emails_to_find": missing}), "rpc.get_uuids_from_emails")
+            found = {row["email"].lower(): row["id"] for row in response.data or []}
+            for email in missing:
+                self._cache.set(email, found.get(email, _NOT_FOUND))
+        return {email: self.lookup(email) for email in emails}
+
+    async def resolve(self, supabase, email: str):
+        """Resolves a single email, from the cache when possible."""
+        email = email.lower()
+        if email not in self._cache:
+            response = await execute(supabase.rpc("get_uuid_from_email", {"email_to_find": email}), "rpc.get_uuid_from_email")
+            self._cache.set(email, response.data or _NOT_FOUND)
+        return self.lookup(email)
+
+
+directory = ContactDirectory()
@@ -0,0 +1,31 @@
+import asyncio
+import inspect
+
+from metrics import registry, timed
+
+
+async def execute(query, name: str = "supabase.query"):
+    """
+    Runs a PostgREST query builder without blocking the event loop.
+
+    Builders from the async Supabase client (the app's) are awaited
+    directly; sync builders, such as the benchmark fakes', run in a worker
+    thread. `name` labels the call in
+    the metrics registry.
+    """
+    with timed(name) as timer:
+        if inspect.iscoroutinefunction(query.execute):
+            response = await query.execute()
+        else:
+            response = await asyncio.to_thread(query.execute)
+        if registry.enabled:
+            timer.payload(getattr(response, "data", None))
+        return response
+
+
+async def call(fn, *args, **kwargs):
+    """Calls a sync or async Supabase method (e.g. an auth call) without blocking."""
+    with timed(f"supabase.{fn.__name__}"):
+        if inspect.iscoroutinefunction(fn):
+            return await fn(*args, **kwargs)
+        return await asyncio.to_thread(fn, *args, **kwargs)
@@ -0,0 +1,92 @@
+from db import execute
+
+PAGE_SIZE = 50
+
+
+def cursor(row):
+    """Keyset position of a message: (created_at, id)."""
+    return (row["created_at"], row["id"])
+
+
+def _quote(value) -> str:
+    """Quotes a value for use inside a PostgREST logical filter tree."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _keyset_bound(op: str, position) -> str:
+    created_at, message_id = (_quote(v) for v in position)
+    return f"or(created_at.{op}.{created_at},and(created_at.eq.{created_at},id.{op}.{message_id}))"
+
+
+def conversation_filter(user_id: str, peer_id: str, before=None, after=None) -> str:
+    """
+    Builds a PostgREST `or` expression matching both directions of a
+    conversation, optionally bounded by a keyset cursor on (created_at, id).
+    """
+    bounds = ""
+    if before is not None:
+        bounds += "," + _keyset_bound("lt", before)
+    if after is not None:
+        bounds += "," + _keyset_bound("gt", after)
+    return (
+        f"and(sender_id.eq.{user_id},receiver_id.eq.{peer_id}{bounds}),"
+        f"and(sender_id.eq.{peer_id},receiver_id.eq.{user_id}{bounds})"
+    )
+
+
+async def fetch_page(supabase, user_id: str, peer_id: str, before=None, after=None, limit: int = PAGE_SIZE):
+    """
+    Fetches one page of a conversation in a single round trip.
+
+    Returns up to `limit` messages in chronological order: the newest ones
+    older than `before` (or the newest overall), or, when `after` is given,
+    the oldest ones newer than `after`.
+    """
+    newest_first = after is None
+    response = await execute(
+        supabase.table("messages")
+        .select("*")
+        .or_(conversation_filter(user_id, peer_id, before=before, after=after))
+        .order("created_at", desc=newest_first)
+        .order("id", desc=newest_first)
+        .limit(limit),
+        "messages.page",
+    )
+    rows = response.data or []
+    if newest_first:
+        rows.reverse()
+    return rows
+
+
+async def fetch_since(supabase, user_id: str, peer_id: str, after, limit: int = PAGE_SIZE):
+    """Fetches every message newer than `after`, page by page."""
+    rows = []
+    while True:
+        page = await fetch_page(supabase, user_id, peer_id, after=after, limit=limit)
+        rows.extend(page)
+        if len(page) < limit:
+            return rows
+        after = cursor(page[-1])
+
+
+def _like_escape(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def search_page(supabase, user_id: str, peer_id: str, terms, before=None, limit: int = PAGE_SIZE):
+    """
+    Server-side search of a conversation: messages older than `before`
+    whose content contains every term, newest first, one page per call.
+    """
+    query = (
+        supabase.table("messages")
+        .select("*")
+        .or_(conversation_filter(user_id, peer_id, before=before))
+    )
+    for term in terms:
+        query = query.ilike("content", f"%{_like_escape(term)}%")
+    response = await execute(
+        query.order("created_at", desc=True).order("id", desc=True).limit(limit),
+        "messages.search",
+    )
+    return response.data or []
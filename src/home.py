@@ -1,28 +1,29 @@
 import flet as ft
 
 from auth import login, signup
+from render_scheduler import schedule_update
 
-def home_view(page: ft.Page, supabase, login_func, signup_func):
+def home_view(page: ft.Page, get_client, login_func, signup_func):
     email = ft.TextField(label="Email", width=300)
     password = ft.TextField(label="Password", width=300, password=True, can_reveal_password=True)
     login_btn = ft.ElevatedButton(text="Login")
     signup_btn = ft.ElevatedButton(text="Sign Up")
     message = ft.Text("")
 
-    def on_login_click(e):
+    async def on_login_click(e):
         if not email.value or not password.value:
             message.value = "Please fill in both fields. also it needs valid e-mail for confirmation and 6 digit or longer password needed."
-            page.update()
+            schedule_update(page)
             return
-        login_func(page, e, email, password, supabase)
+        await login_func(page, e, email, password, await get_client())
 
 
-    def on_signup_click(e):
+    async def on_signup_click(e):
         if not email.value or not password.value:
             message.value = "Please fill in both fields.  also it needs valid e-mail for confirmation and 6 digit or longer password needed."
-            page.update()
+            schedule_update(page)
             return
-        signup_func(page, e, email, password, supabase)
+        await signup_func(page, e, email, password, await get_client())
 
 
     login_btn.on_click = on_login_click
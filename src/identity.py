@@ -0,0 +1,166 @@
+import asyncio
+import os
+import time
+
+import jwt
+
+from db import call
+
+# Refresh this long before the access token expires.
+REFRESH_MARGIN = 60
+# Retry a failed refresh this often until the token runs out.
+RETRY_INTERVAL = 15
+REFRESH_TOKEN_KEY = "chat_app.refresh_token"
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def decode_token(token: str, secret: str = None, leeway: int = 30, now: float = None) -> dict:
+    """
+    Decodes a Supabase access token and checks it locally.
+
+    When `secret` (or SUPABASE_JWT_SECRET) is available the token must be
+    an HS256 token signed with it; any other algorithm, `none` included,
+    is rejected. Without a secret, tokens are trusted as received from the
+    auth server over TLS. Expiry is always checked.
+    """
+    secret = secret if secret is not None else os.environ.get("SUPABASE_JWT_SECRET")
+    options = {"verify_signature": bool(secret), "verify_exp": False, "verify_iat": False, "verify_nbf": False, "verify_aud": False}
+    try:
+        claims = jwt.decode(token, secret or None, algorithms=["HS256"], options=options)
+    except jwt.InvalidAlgorithmError as e:
+        raise InvalidToken(f"Token algorithm not allowed: {e}") from e
+    except jwt.InvalidSignatureError as e:
+        raise InvalidToken("Bad token signature") from e
+    except jwt.InvalidTokenError as e:
+        raise InvalidToken(f"Malformed token: {e}") from e
+
+    if "sub" not in claims or "exp" not in claims:
+        raise InvalidToken("Token is missing sub/exp")
+    if claims["exp"] + leeway < (now if now is not None else time.time()):
+        raise InvalidToken("Token has expired")
+    return claims
+
+
+class Identity:
+    """Who is signed in, as read from the access token's claims."""
+
+    __slots__ = ("user_id", "email", "expires_at", "access_token", "refresh_token")
+
+    def __init__(self, user_id, email, expires_at, access_token, refresh_token):
+        self.user_id = user_id
+        self.email = email
+        self.expires_at = expires_at
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+
+    @classmethod
+    def from_session(cls, session):
+        claims = decode_token(session.access_token)
+        return cls(claims["sub"], claims.get("email"), claims["exp"], session.access_token, session.refresh_token)
+
+
+class SessionIdentity:
+    """
+    The signed-in identity of one Flet session.
+
+    Views read the user from here instead of calling `auth.get_user()`.
+    The access token is refreshed shortly before it expires, so the auth
+    server sees one request per token lifetime, and the refresh token is
+    kept in the browser's client storage so a returning user is signed in
+    again without a password.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.identity = None
+        self._refresh = None
+
+    async def establish(self, supabase, session) -> Identity:
+        """Adopts a new auth session (after login, signup or a refresh)."""
+        identity = Identity.from_session(session)
+        self.identity = identity
+        self.page.session.set("user_id", identity.user_id)
+        self.page.session.set("user_email", identity.email)
+        try:
+            await self.page.client_storage.set_async(REFRESH_TOKEN_KEY, identity.refresh_token)
+        except Exception as e:
+            print(f"Error storing refresh token: {e}")
+        self._schedule(supabase)
+        return identity
+
+    async def restore(self, supabase):
+        """Signs in again with the stored refresh token; returns None if there is none or it's revoked."""
+        try:
+            refresh_token = await self.page.client_storage.get_async(REFRESH_TOKEN_KEY)
+        except Exception as e:
+            print(f"Error reading refresh token: {e}")
+            return None
+        if not refresh_token:
+            return None
+        try:
+            response = await call(supabase.auth.refresh_session, refresh_token)
+            return await self.establish(supabase, response.session)
+        except Exception as e:
+            print(f"Error restoring session: {e}")
+            await self.forget()
+            return None
+
+    def stop(self):
+        """Cancels the scheduled refresh, e.g. while the browser is disconnected."""
+        if self._refresh is not None:
+            self._refresh.cancel()
+            self._refresh = None
+
+    def resume(self, supabase):
+        """Schedules the refresh again after `stop`; a lapsed token is refreshed right away."""
+        if self.identity is not None and self._refresh is None and supabase is not None:
+            self._schedule(supabase)
+
+    async def forget(self):
+        """Drops the identity and the stored refresh token (logout)."""
+        self.stop()
+        self.identity = None
+        self.page.session.remove("user_id")
+        self.page.session.remove("user_email")
+        try:
+            await self.page.client_storage.remove_async(REFRESH_TOKEN_KEY)
+        except Exception as e:
+            print(f"Error removing refresh token: {e}")
+
+    # --- Internal helpers ---
+
+    def _schedule(self, supabase):
+        self.stop()
+        self._refresh = self.page.run_task(self._refresh_before_expiry, supabase, self.identity)
+
+    async def _refresh_before_expiry(self, supabase, identity: Identity):
+        await asyncio.sleep(max(0, identity.expires_at - REFRESH_MARGIN - time.time()))
+        while self.identity is identity:
+            try:
+                response = await call(supabase.auth.refresh_session, identity.refresh_token)
+            except Exception as e:
+                if time.time() >= identity.expires_at:
+                    print(f"Session expired: {e}")
+                    self._refresh = None
+                    await self.forget()
+                    self.page.go("/")
+                    return
+                print(f"Error refreshing session: {e}")
+                await asyncio.sleep(RETRY_INTERVAL)
+                continue
+            # Hands off to a new task scheduled for the new token.
+            self._refresh = None
+            await self.establish(supabase, response.session)
+            return
+
+
+def identity_for(page) -> SessionIdentity:
+    """The page's identity, created on first use and kept in the session."""
+    identity = page.session.get("identity")
+    if identity is None:
+        identity = SessionIdentity(page)
+        page.session.set("identity", identity)
+    return identity
@@ -0,0 +1,83 @@
+import threading
+
+from db import execute
+
+
+class ConversationSummary:
+    """Last message and unread count of one conversation."""
+
+    __slots__ = ("peer_id", "last_sender_id", "last_content", "last_created_at", "unread")
+
+    def __init__(self, peer_id, last_sender_id=None, last_content=None, last_created_at=None, unread=0):
+        self.peer_id = peer_id
+        self.last_sender_id = last_sender_id
+        self.last_content = last_content
+        self.last_created_at = last_created_at
+        self.unread = unread
+
+
+class Inbox:
+    """
+    Per-session summaries of every conversation of `user_id`.
+
+    `load` fetches them all with the `inbox_summaries` RPC, a single round
+    trip however many contacts there are. After that `apply` folds each
+    realtime message into the summary of its conversation, so the inbox
+    stays current without querying again. Requires the `inbox_summaries`
+    function and the `conversation_reads` table from the README.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        # Messages from the open conversation are read as they arrive.
+        self.active_peer = None
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def get(self, peer_id):
+        return self._summaries.get(peer_id)
+
+    async def load(self, supabase):
+        response = await execute(supabase.rpc("inbox_summaries"), "rpc.inbox_summaries")
+        with self._lock:
+            self._summaries = {
+                row["peer_id"]: ConversationSummary(
+                    row["peer_id"],
+                    row.get("last_sender_id"),
+                    row.get("last_content"),
+                    row.get("last_created_at"),
+                    row.get("unread_count") or 0,
+                )
+                for row in response.data or []
+            }
+
+    def apply(self, row):
+        """Updates the summary of the conversation `row` belongs to and returns it."""
+        peer_id = row["receiver_id"] if row["sender_id"] == self.user_id else row["sender_id"]
+        with self._lock:
+            summary = self._summaries.get(peer_id)
+            if summary is None:
+                summary = self._summaries[peer_id] = ConversationSummary(peer_id)
+            if summary.last_created_at is None or row["created_at"] >= summary.last_created_at:
+                summary.last_sender_id = row["sender_id"]
+                summary.last_content = row["content"]
+                summary.last_created_at = row["created_at"]
+            if row["sender_id"] != self.user_id and peer_id != self.active_peer:
+                summary.unread += 1
+        return summary
+
+    async def mark_read(self, supabase, peer_id: str):
+        """Clears the unread count locally and records the read position on the server."""
+        with self._lock:
+            summary = self._summaries.get(peer_id)
+            if summary is None or summary.last_created_at is None:
+                return
+            summary.unread = 0
+            read_at = summary.last_created_at
+        await execute(
+            supabase.table("conversation_reads").upsert(
+                {"user_id": self.user_id, "peer_id": peer_id, "last_read_at": read_at},
+                on_conflict="user_id,peer_id",
+            ),
+            "conversation_reads.upsert",
+        )
@@ -1,13 +1,23 @@
+import asyncio
+import importlib
 import os
 from dotenv import load_dotenv
 import flet as ft
-from supabase import create_client, Client
 
 import auth
+import metrics
+from attachments import upload_dir
+from clients import ClientFactory
 from home import home_view
-from chat import chat_view
+from identity import identity_for
+from realtime_hub import hub
+from view_cache import view_cache_for
 
-# --- Initialization (no changes) ---
+# Startup only pays for the login screen: `supabase` and the chat view (with
+# qrcode/PIL behind it) are imported when first needed or warmed after the
+# first page has been served.
+
+# --- Initialization ---
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
 
 url: str = os.environ.get("SUPABASE_URL")
@@ -15,32 +25,72 @@ key: str = os.environ.get("SUPABASE_KEY")
 if not url or not key:
     raise EnvironmentError("SUPABASE_URL and SUPABASE_KEY must be set in the .env file.")
 
-supabase: Client = create_client(url, key)
+# CHAT_METRICS=1 records timings; CHAT_METRICS_PORT also serves /metrics.
+metrics.start_from_env()
+
+# One async client per session (isolated auth, realtime), all sharing one
+# HTTP connection pool.
+client_factory = ClientFactory(url, key)
+
+
+async def get_client(page: ft.Page):
+    """Returns this session's Supabase client, creating it once on first use."""
+    task = page.session.get("supabase_task")
+    if task is None:
+        task = asyncio.ensure_future(client_factory.create())
+        page.session.set("supabase_task", task)
+    client = await asyncio.shield(task)
+    page.session.set("supabase", client)
+    return client
+
+
+async def warm_up(page: ft.Page):
+    """
+    Creates the session's client and imports the chat view in the background,
+    then signs a returning user back in with their stored refresh token.
+    """
+    try:
+        client = await get_client(page)
+        await asyncio.to_thread(importlib.import_module, "chat")
+        if not page.session.get("user_id") and await identity_for(page).restore(client):
+            page.go("/chat")
+    except Exception as e:
+        print(f"Error warming up: {e}")
 
 
 # --- Main Application Logic ---
-def main(page: ft.Page):
+async def main(page: ft.Page):
+    # The chat view subscribes from sync handlers; realtime calls run on this loop.
+    hub.use_loop(asyncio.get_running_loop())
     page.title = "Authentication Zone"
     page.vertical_alignment = ft.MainAxisAlignment.CENTER
     page.horizontal_alignment = ft.CrossAxisAlignment.CENTER
 
     # IMPROVED: This function now directly uses the 'route' passed to it.
+    @metrics.instrument("route_change")
     def route_change(e: ft.RouteChangeEvent):
         # If the user is navigating to the home page, clear the history.
         if e.route == "/":
             page.views.clear()
-            page.views.append(home_view(page, supabase, auth.login, auth.signup))
+            page.views.append(home_view(page, lambda: get_client(page), auth.login, auth.signup))
         
         # If the user is navigating to the chat page...
         elif e.route == "/chat":
             user_id = page.session.get("user_id")
-            if not user_id:
+            if not user_id or not page.session.get("supabase"):
                 # If not logged in, just redirect, don't change the view stack.
                 page.go("/")
                 return
             
+            # Returning to the chat reuses the live view: no requests, no re-subscribe.
+            view = view_cache_for(page).get("/chat", user_id)
+            if view is None:
+                # Chat-only dependencies load on the first visit (if not warmed already).
+                from chat import chat_view
+                view = chat_view(page, page.session.get("supabase"), user_id)
+
             # Add the chat view on top of the home view.
-            page.views.append(chat_view(page, supabase, user_id))
+            page.views.append(view)
         
         page.update()
 
@@ -50,12 +100,36 @@ def main(page: ft.Page):
         top_view = page.views[-1] # Get the new top view
         page.go(top_view.route) # Navigate to the new top view's route
 
+    def disconnect(e):
+        """Pauses the token refresh; the session and its views survive a reconnect."""
+        identity_for(page).stop()
+
+    def connect(e):
+        """Resumes the token refresh when the browser reconnects to the session."""
+        identity_for(page).resume(page.session.get("supabase"))
+
+    def close(e):
+        """Releases the expired session's cached views (realtime listeners, caches)."""
+        identity_for(page).stop()
+        view_cache_for(page).invalidate()
+
     page.on_route_change = route_change
     page.on_view_pop = view_pop
+    page.on_connect = connect
+    page.on_disconnect = disconnect
+    page.on_close = close
     
     # This call triggers the initial page load 🚀
     page.go("/")
+    page.run_task(warm_up, page)
 
 # It's good practice to run the app within a name==main block.
 if __name__ == "__main__":
-    ft.app(target=main, view=ft.AppView.WEB_BROWSER)
\ No newline at end of file
+    # CHAT_WORKERS=N serves the app from N processes behind CHAT_PORT (see cluster.py).
+    workers = int(os.environ.get("CHAT_WORKERS", "1"))
+    if workers > 1:
+        import cluster
+        cluster.run(main, workers, host=os.environ.get("CHAT_HOST", "0.0.0.0"), port=int(os.environ.get("CHAT_PORT", "8550")))
+    else:
+        # Browser file uploads land in upload_dir() before going to storage.
+        ft.app(target=main, view=ft.AppView.WEB_BROWSER, upload_dir=upload_dir())
\ No newline at end of file
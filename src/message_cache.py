@@ -0,0 +1,119 @@
+import json
+import os
+import sqlite3
+import threading
+
+
+def default_cache_dir() -> str:
+    """CHAT_CACHE_DIR, or a per-user cache directory under the home folder."""
+    return os.environ.get("CHAT_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "chat_app")
+
+
+class MessageCache:
+    """
+    On-disk cache of one user's conversations, backed by stdlib sqlite3.
+
+    Rows are stored as JSON next to the columns they are looked up by, and
+    indexed by (peer_id, created_at, id) so the newest page and older pages
+    are index range scans.
+
+    The delta-sync cursor is kept apart from the rows: `mark_synced` records
+    how far a conversation was fetched from the server, so our own sends
+    written here can't move it past peer messages that were never fetched.
+    """
+
+    def __init__(self, user_id: str, directory: str = None):
+        directory = directory or default_cache_dir()
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"messages-{user_id}.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id PRIMARY KEY,"
+                " peer_id TEXT NOT NULL,"
+                " created_at TEXT NOT NULL,"
+                " row TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS messages_peer_created"
+                " ON messages (peer_id, created_at, id)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS synced ("
+                " peer_id TEXT PRIMARY KEY,"
+                " created_at TEXT NOT NULL,"
+                " id NOT NULL)"
+            )
+
+    def _select(self, sql: str, params) -> list:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(row) for (row,) in rows]
+
+    def latest(self, peer_id: str, limit: int) -> list:
+        """The newest `limit` cached messages with `peer_id`, oldest first."""
+        rows = self._select(
+            "SELECT row FROM messages WHERE peer_id = ?"
+            " ORDER BY created_at DESC, id DESC LIMIT ?",
+            (peer_id, limit),
+        )
+        rows.reverse()
+        return rows
+
+    def before(self, peer_id: str, position, limit: int) -> list:
+        """Up to `limit` cached messages older than `position`, oldest first."""
+        created_at, message_id = position
+        rows = self._select(
+            "SELECT row FROM messages WHERE peer_id = ? AND (created_at, id) < (?, ?)"
+            " ORDER BY created_at DESC, id DESC LIMIT ?",
+            (peer_id, created_at, message_id, limit),
+        )
+        rows.reverse()
+        return rows
+
+    def newest_cursor(self, peer_id: str):
+        """(created_at, id) of the newest cached message with `peer_id`, or None."""
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT created_at, id FROM messages WHERE peer_id = ?"
+                " ORDER BY created_at DESC, id DESC LIMIT 1",
+                (peer_id,),
+            ).fetchone()
+        return tuple(found) if found else None
+
+    def synced_through(self, peer_id: str):
+        """(created_at, id) up to which `peer_id`'s messages were fetched, or None."""
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT created_at, id FROM synced WHERE peer_id = ?", (peer_id,)
+            ).fetchone()
+        return tuple(found) if found else None
+
+    def mark_synced(self, peer_id: str, position):
+        """Records that every message with `peer_id` up to `position` is cached; never moves back."""
+        created_at, message_id = position
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO synced (peer_id, created_at, id) VALUES (?, ?, ?)"
+                " ON CONFLICT (peer_id) DO UPDATE SET created_at = excluded.created_at, id = excluded.id"
+                " WHERE (excluded.created_at, excluded.id) > (synced.created_at, synced.id)",
+                (peer_id, created_at, message_id),
+            )
+
+    def upsert(self, peer_id: str, rows):
+        """Stores or replaces messages exchanged with `peer_id`."""
+        params = [(row["id"], peer_id, row["created_at"], json.dumps(row)) for row in rows]
+        if not params:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages (id, peer_id, created_at, row) VALUES (?, ?, ?, ?)",
+                params,
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
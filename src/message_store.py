@@ -0,0 +1,167 @@
+import sys
+
+DEFAULT_CAPACITY = 2000
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Message:
+    """
+    One chat message holding only the fields the UI needs.
+
+    Uses `__slots__` instead of the full row dict returned by
+    `select("*")`, and interns the sender/receiver ids, which repeat on
+    every message of a conversation. Supports `msg["content"]` so code
+    written against row dicts keeps working. `attachment` is the file's
+    metadata (see attachments.py), or None for text messages.
+    """
+
+    __slots__ = ("id", "sender_id", "receiver_id", "content", "created_at", "attachment")
+
+    def __init__(self, id, sender_id, receiver_id, content, created_at, attachment=None):
+        self.id = id
+        self.sender_id = _intern(sender_id)
+        self.receiver_id = _intern(receiver_id)
+        self.content = content
+        self.created_at = created_at
+        self.attachment = attachment
+
+    @classmethod
+    def from_row(cls, row):
+        if isinstance(row, cls):
+            return row
+        return cls(row["id"], row["sender_id"], row["receiver_id"], row["content"], row["created_at"], row.get("attachment"))
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def to_row(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @property
+    def cursor(self):
+        return (self.created_at, self.id)
+
+
+class MessageStore:
+    """
+    Bounded, de-duplicated, chronologically sorted messages of one chat.
+
+    New arrivals beyond `capacity` evict the oldest messages, ring-buffer
+    style; evicted history is reloaded from the message cache or the server
+    when the user scrolls back to it. Older pages added while scrolling
+    back are kept until the next arrival trims the store again.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.spilled = False
+        self._messages = []
+        self._keys = []
+        self._ids = set()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __getitem__(self, index):
+        return self._messages[index]
+
+    def __contains__(self, message_id):
+        return message_id in self._ids
+
+    @property
+    def newest(self):
+        return self._messages[-1] if self._messages else None
+
+    def clear(self):
+        self._messages.clear()
+        self._keys.clear()
+        self._ids.clear()
+        self.spilled = False
+
+    def reset(self, rows):
+        """Replaces the contents with `rows`."""
+        self.clear()
+        return self.add(rows)
+
+    def latest(self, count: int) -> list:
+        return self._messages[-count:] if count else []
+
+    def before(self, position, count: int) -> list:
+        """Up to `count` stored messages older than `position`, oldest first."""
+        end = self._index(position)
+        return self._messages[max(0, end - count):end]
+
+    def after(self, position, count: int) -> list:
+        """Up to `count` stored messages newer than `position`, oldest first."""
+        start = self._index(position)
+        if start < len(self._keys) and self._keys[start] == position:
+            start += 1
+        return self._messages[start:start + count]
+
+    def add(self, rows) -> list:
+        """Stores new messages, skipping known ids, and trims the oldest past capacity."""
+        added = self._insert(rows)
+        overflow = len(self._messages) - self.capacity
+        if overflow > 0:
+            for message in self._messages[:overflow]:
+                self._ids.discard(message.id)
+            del self._messages[:overflow]
+            del self._keys[:overflow]
+            self.spilled = True
+        return added
+
+    def add_older(self, rows) -> list:
+        """Stores a page of older history without evicting anything."""
+        return self._insert(rows)
+
+    def update(self, row):
+        """
+        Replaces the stored message with the same id, e.g. a pending message
+        with its stored copy, moving it if its timestamp changed. Returns the
+        new Message, or None if that id isn't stored.
+        """
+        message = Message.from_row(row)
+        if message.id not in self._ids:
+            return None
+        for index in range(len(self._messages) - 1, -1, -1):
+            if self._messages[index].id == message.id:
+                break
+        del self._messages[index]
+        del self._keys[index]
+        self._ids.discard(message.id)
+        self._insert([message])
+        return message
+
+    def _index(self, position) -> int:
+        lo, hi = 0, len(self._keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._keys[mid] < position:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _insert(self, rows) -> list:
+        added = []
+        for row in rows:
+            message = Message.from_row(row)
+            if message.id in self._ids:
+                continue
+            key = message.cursor
+            if not self._keys or self._keys[-1] < key:
+                self._messages.append(message)
+                self._keys.append(key)
+            else:
+                index = self._index(key)
+                self._messages.insert(index, message)
+                self._keys.insert(index, key)
+            self._ids.add(message.id)
+            added.append(message)
+        return added
@@ -0,0 +1,176 @@
+import itertools
+from collections import deque
+
+
+class MessageListRenderer:
+    """
+    Keeps a bounded window of message controls mounted in a ListView.
+
+    New messages add exactly one control and older history is prepended in
+    batches, so the work done per event no longer grows with the length of
+    the conversation. Controls that fall out of the window are kept in a
+    small pool and reused for the next rows that get mounted.
+
+    `render(row, control)` must return a control for `row`; when `control`
+    is not None it is a recycled control that should be updated in place.
+    Mounted controls are indexed by message id, so `update(row)` can
+    re-render a single message, e.g. when a pending send is confirmed.
+    `request_update(list_view)`, if given, replaces the direct
+    `list_view.update()` so a render scheduler can coalesce refreshes.
+
+    Paging back through history trims the newest rows off the bottom, so
+    the window stays at `max_mounted` wherever the user is reading. While
+    `has_newer` is set the window no longer reaches the latest message:
+    `extend` leaves new messages unmounted until `extend_newer` pages the
+    window back down (or `reset` jumps to the latest).
+    """
+
+    def __init__(self, list_view, render, max_mounted: int = 300, pool_size: int = 50, request_update=None):
+        self.list_view = list_view
+        self.render = render
+        self.request_update = request_update
+        self.max_mounted = max_mounted
+        self.pool_size = pool_size
+        self._rows = deque()
+        self._pool = []
+        self._by_id = {}
+        self.has_newer = False
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def oldest(self):
+        """The oldest row currently mounted, or None."""
+        return self._rows[0] if self._rows else None
+
+    @property
+    def newest(self):
+        """The newest row currently mounted, or None."""
+        return self._rows[-1] if self._rows else None
+
+    def get(self, message_id):
+        """The mounted control of a message, or None."""
+        return self._by_id.get(message_id)
+
+    def visible(self, pixels: float = None, max_extent: float = None, viewport: float = None,
+                margin: int = 3, default: int = 20) -> list:
+        """
+        The mounted rows estimated to be on screen (plus `margin` on each
+        side) for a ListView scroll position, assuming rows of similar
+        height. Without a position the list is taken to be at the bottom,
+        and the newest `default` rows are returned.
+        """
+        count = len(self._rows)
+        if not count:
+            return []
+        if pixels is None or not viewport:
+            return list(itertools.islice(self._rows, max(0, count - default), count))
+        if not max_extent:
+            return list(self._rows)
+        row_height = (max_extent + viewport) / count
+        first = max(0, int(pixels / row_height) - margin)
+        last = min(count, int((pixels + viewport) / row_height) + 1 + margin)
+        return list(itertools.islice(self._rows, first, last))
+
+    # --- Internal helpers ---
+
+    def _build(self, row):
+        control = self._pool.pop() if self._pool else None
+        control = self.render(row, control)
+        self._by_id[row["id"]] = control
+        return control
+
+    def _recycle(self, control):
+        if len(self._pool) < self.pool_size:
+            self._pool.append(control)
+
+    def _trim_head(self):
+        controls = self.list_view.controls
+        while len(self._rows) > self.max_mounted:
+            self._by_id.pop(self._rows.popleft()["id"], None)
+            self._recycle(controls.pop(0))
+
+    def _trim_tail(self, keep: int):
+        """Trims the newest rows past `max_mounted`, but never the `keep` oldest."""
+        controls = self.list_view.controls
+        while len(self._rows) > max(self.max_mounted, keep):
+            self._by_id.pop(self._rows.pop()["id"], None)
+            self._recycle(controls.pop())
+            self.has_newer = True
+
+    def refresh(self):
+        """Sends only the ListView's diff, and only once it is on a page."""
+        if self.request_update is not None:
+            self.request_update(self.list_view)
+        elif self.list_view.page is not None:
+            self.list_view.update()
+
+    # --- Render paths ---
+
+    def reset(self, rows):
+        """Replaces the window with the newest `max_mounted` rows."""
+        controls = self.list_view.controls
+        for control in controls:
+            self._recycle(control)
+        controls.clear()
+        self._rows.clear()
+        self._by_id.clear()
+        self.has_newer = False
+
+        for row in list(rows)[-self.max_mounted:]:
+            controls.append(self._build(row))
+            self._rows.append(row)
+        self.refresh()
+
+    def update(self, row):
+        """Re-renders the mounted control of `row`'s id in place; no-op if not mounted."""
+        control = self._by_id.get(row["id"])
+        if control is None:
+            return
+        for index in range(len(self._rows) - 1, -1, -1):
+            if self._rows[index]["id"] == row["id"]:
+                self._rows[index] = row
+                break
+        self.render(row, control)
+        self.refresh()
+
+    def append(self, row):
+        """Mounts one new message at the bottom, recycling the oldest if full."""
+        self.extend([row])
+
+    def extend(self, rows):
+        """
+        Mounts a batch of new messages with a single trim and refresh. The
+        trim never reaches the rows just mounted. No-op while `has_newer`.
+        """
+        rows = list(rows)
+        if not rows or self.has_newer:
+            return
+        for row in rows[-self.max_mounted:]:
+            self.list_view.controls.append(self._build(row))
+            self._rows.append(row)
+        self._trim_head()
+        self.refresh()
+
+    def prepend(self, rows):
+        """
+        Mounts a batch of older messages (oldest first) above the window and
+        trims the newest rows off the bottom, keeping the batch itself.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        self.list_view.controls[0:0] = [self._build(row) for row in rows]
+        self._rows.extendleft(reversed(rows))
+        self._trim_tail(keep=len(rows))
+        self.refresh()
+
+    def extend_newer(self, rows, more: bool):
+        """
+        Mounts the next newer messages below a window that `prepend`
+        trimmed; `more` says whether newer ones are still unmounted.
+        """
+        self.has_newer = False
+        self.extend(rows)
+        self.has_newer = more
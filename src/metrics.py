@@ -0,0 +1,300 @@
+import bisect
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").lower() in ("1", "true", "yes")
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Operation:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.payload = Histogram(SIZE_BUCKETS)
+        self.errors = 0
+
+
+class Registry:
+    """
+    Per-operation latency and payload-size histograms plus error counts.
+
+    Recording is a no-op unless `enabled` is set (CHAT_METRICS=1), so the
+    instrumented hot paths only pay for a flag check when it is off.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._operations = {}
+        self._collectors = []
+
+    def add_collector(self, collect):
+        """Registers `collect() -> {name: value}`, exported as extra counters."""
+        self._collectors.append(collect)
+
+    def record(self, name: str, seconds: float, size: int = None, error: bool = False):
+        with self._lock:
+            operation = self._operations.get(name)
+            if operation is None:
+                operation = self._operations[name] = Operation()
+            operation.latency.observe(seconds)
+            if size is not None:
+                operation.payload.observe(size)
+            if error:
+                operation.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            operations = {
+                name: {
+                    "count": op.latency.count,
+                    "errors": op.errors,
+                    "latency_seconds": {"sum": op.latency.sum, "buckets": list(op.latency.counts)},
+                    "payload_bytes": {"sum": op.payload.sum, "buckets": list(op.payload.counts)},
+                }
+                for name, op in self._operations.items()
+            }
+        counters = {}
+        for collect in self._collectors:
+            counters.update(collect())
+        return {"operations": operations, "counters": counters}
+
+    def prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+
+        def histogram(metric, buckets, key, unit_help):
+            lines.append(f"# HELP {metric} {unit_help}")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, op in snapshot["operations"].items():
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ["+Inf"], op[key]["buckets"]):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{op="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{op="{name}"}} {op[key]["sum"]}')
+                lines.append(f'{metric}_count{{op="{name}"}} {cumulative}')
+
+        histogram("chat_operation_latency_seconds", LATENCY_BUCKETS, "latency_seconds", "Operation latency.")
+        histogram("chat_operation_payload_bytes", SIZE_BUCKETS, "payload_bytes", "Response payload size.")
+        lines.append("# HELP chat_operation_errors_total Failed operations.")
+        lines.append("# TYPE chat_operation_errors_total counter")
+        for name, op in snapshot["operations"].items():
+            lines.append(f'chat_operation_errors_total{{op="{name}"}} {op["errors"]}')
+        for name, value in snapshot["counters"].items():
+            lines.append(f"# TYPE chat_{name} counter")
+            lines.append(f"chat_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(enabled=_env_flag("CHAT_METRICS"))
+
+
+# --- Timing helpers ---
+
+def payload_size(data) -> int:
+    """Approximate wire size of a response payload."""
+    try:
+        return len(json.dumps(data, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class _Timer:
+    __slots__ = ("name", "start", "size")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.size = None
+
+    def payload(self, data):
+        self.size = payload_size(data)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        registry.record(self.name, time.perf_counter() - self.start, self.size, error=exc_type is not None)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def payload(self, data):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(name: str):
+    """`with timed("op") as t: ...; t.payload(data)` records one operation."""
+    return _Timer(name) if registry.enabled else _NULL_TIMER
+
+
+def instrument(name: str):
+    """Decorator form of `timed` for sync and async functions."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not registry.enabled:
+                    return await fn(*args, **kwargs)
+                with timed(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            with timed(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# --- Sampling profiler ---
+
+class SamplingProfiler:
+    """
+    Samples every thread's stack at a fixed interval and aggregates them as
+    collapsed stacks (the input format of flamegraph.pl / speedscope).
+    Can be started and stopped at runtime, e.g. from the metrics endpoint.
+    """
+
+    def __init__(self):
+        self.interval = 0.005
+        self._stacks = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: float = None):
+        with self._lock:
+            if self._thread is not None:
+                return
+            if interval:
+                self.interval = interval
+            self._stacks = Counter()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> str:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(stack))] += 1
+
+
+profiler = SamplingProfiler()
+
+
+# --- Endpoint ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def _send(self, body: str, content_type: str = "text/plain; version=0.0.4"):
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            self._send(registry.prometheus())
+        elif path == "/metrics.json":
+            self._send(json.dumps(registry.snapshot()), "application/json")
+        elif path == "/profiler":
+            self._send(profiler.collapsed())
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/profiler/start":
+            interval_ms = parse_qs(url.query).get("interval_ms", [None])[0]
+            profiler.start(float(interval_ms) / 1000 if interval_ms else None)
+            self._send("started\n")
+        elif url.path == "/profiler/stop":
+            self._send(profiler.stop())
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int, host: str = "127.0.0.1"):
+    """Serves /metrics, /metrics.json and the profiler controls in a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+    return server
+
+
+def start_from_env():
+    """
+    Applies CHAT_METRICS (enable recording) and CHAT_METRICS_PORT (serve the
+    endpoint, which also enables recording). Call after the .env is loaded.
+    """
+    port = os.environ.get("CHAT_METRICS_PORT")
+    registry.enabled = registry.enabled or _env_flag("CHAT_METRICS") or bool(port)
+    if port:
+        return serve(int(port), os.environ.get("CHAT_METRICS_HOST", "127.0.0.1"))
@@ -0,0 +1,134 @@
+import asyncio
+import itertools
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from db import execute
+
+SENDING = "sending"
+RETRYING = "retrying"
+FAILED = "failed"
+
+
+def new_message(sender_id: str, receiver_id: str, content: str, attachment: dict = None) -> dict:
+    """
+    A message row with a client-generated id, ready to render before it is
+    stored. `created_at` is the local clock until the server's value replaces it.
+    """
+    row = {
+        "id": str(uuid.uuid4()),
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
+        "content": content,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if attachment is not None:
+        row["attachment"] = attachment
+    return row
+
+
+class Outbox:
+    """
+    Sends messages in the background so the UI never waits on an insert.
+
+    Queued rows are flushed by a single task in batched inserts: whatever
+    piles up while one batch is in flight goes out together in the next.
+    A failed batch is retried with exponential backoff, up to
+    `max_attempts`, and then marked FAILED. Inserts are upserts on the
+    client-generated id that ignore duplicates, so retrying a batch that
+    actually reached the database is harmless.
+
+    `on_sent(rows)` receives the stored rows (with the server's
+    `created_at`); `on_state(rows)` is called whenever rows change state.
+    """
+
+    def __init__(self, supabase, on_sent=None, on_state=None, batch_size: int = 50,
+                 retry_base: float = 0.5, retry_max: float = 30.0, max_attempts: int = 8):
+        self.supabase = supabase
+        self.on_sent = on_sent
+        self.on_state = on_state
+        self.batch_size = batch_size
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self._queue = OrderedDict()   # id -> row, oldest first
+        self._states = {}             # id -> SENDING / RETRYING / FAILED
+        self._failed = OrderedDict()  # id -> row that ran out of attempts
+        self._task = None
+
+    def __contains__(self, message_id):
+        return message_id in self._states
+
+    def __len__(self):
+        return len(self._queue)
+
+    def state(self, message_id):
+        """SENDING, RETRYING or FAILED for unsent messages, None once stored."""
+        return self._states.get(message_id)
+
+    def put(self, row: dict):
+        """Queues a row built by `new_message`. Must be called on the event loop."""
+        self._queue[row["id"]] = row
+        self._states[row["id"]] = SENDING
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush())
+
+    def confirm(self, message_id) -> bool:
+        """Marks a message stored, e.g. when its realtime echo beats the insert response."""
+        self._queue.pop(message_id, None)
+        self._failed.pop(message_id, None)
+        return self._states.pop(message_id, None) is not None
+
+    def retry_failed(self):
+        """Re-queues every message that ran out of attempts. Must be called on the event loop."""
+        failed = list(self._failed.values())
+        self._failed.clear()
+        for row in failed:
+            self.put(row)
+        self._notify(self.on_state, failed)
+
+    # --- Internal helpers ---
+
+    def _notify(self, callback, rows):
+        if callback is not None and rows:
+            try:
+                callback(rows)
+            except Exception as e:
+                print(f"Error in outbox callback: {e}")
+
+    async def _flush(self):
+        attempt = 0
+        while self._queue:
+            batch = list(itertools.islice(self._queue.values(), self.batch_size))
+            payload = [{k: row[k] for k in ("id", "sender_id", "receiver_id", "content", "attachment") if k in row} for row in batch]
+            try:
+                response = await execute(
+                    self.supabase.table("messages").upsert(payload, on_conflict="id", ignore_duplicates=True),
+                    "messages.insert",
+                )
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    print(f"Error sending messages, giving up: {e}")
+                    for row in batch:
+                        if self._queue.pop(row["id"], None) is not None:
+                            self._states[row["id"]] = FAILED
+                            self._failed[row["id"]] = row
+                    self._notify(self.on_state, batch)
+                    attempt = 0
+                    continue
+                print(f"Error sending messages (attempt {attempt}): {e}")
+                for row in batch:
+                    if row["id"] in self._queue:
+                        self._states[row["id"]] = RETRYING
+                self._notify(self.on_state, batch)
+                await asyncio.sleep(min(self.retry_max, self.retry_base * 2 ** (attempt - 1)))
+                continue
+
+            attempt = 0
+            stored = {row["id"]: row for row in response.data or []}
+            # Rows missing from the response were already stored (an earlier
+            # attempt got through); they keep their local values until the echo.
+            sent = [stored.get(row["id"], row) for row in batch if self.confirm(row["id"])]
+            self._notify(self.on_sent, sent)
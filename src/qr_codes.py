@@ -0,0 +1,80 @@
+import base64
+import hashlib
+import io
+import os
+
+from ttl_cache import TTLCache
+
+# "png" renders through PIL; "svg" builds vector markup and skips raster encoding.
+QR_FORMAT = os.environ.get("CHAT_QR_FORMAT", "png").lower()
+
+_cache = TTLCache(maxsize=256, ttl=24 * 60 * 60)
+
+
+def _store_dir():
+    """Optional persistent store for rendered codes (CHAT_QR_CACHE_DIR)."""
+    return os.environ.get("CHAT_QR_CACHE_DIR")
+
+
+def _store_path(directory: str, data: str, fmt: str) -> str:
+    digest = hashlib.sha256(f"{fmt}:{data}".encode()).hexdigest()
+    return os.path.join(directory, f"{digest}.{fmt}.txt")
+
+
+def _make_qr(data: str):
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=4, border=2)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def _render_png(data: str) -> str:
+    img = _make_qr(data).make_image(fill_color='black', back_color='white')
+
+    buffered = io.BytesIO()
+    img.save(buffered, format="PNG")
+    img_str = base64.b64encode(buffered.getvalue()).decode()
+    return f"data:image/png;base64,{img_str}"
+
+
+def _render_svg(data: str) -> str:
+    import qrcode.image.svg
+
+    img = _make_qr(data).make_image(image_factory=qrcode.image.svg.SvgPathImage)
+    return img.to_string().decode()
+
+
+def peek_qr_code(data: str, fmt: str = QR_FORMAT):
+    """Returns an already generated code for `data`, or None, without rendering."""
+    return _cache.get((fmt, data))
+
+
+def generate_qr_code(data: str, fmt: str = QR_FORMAT) -> str:
+    """
+    Returns a QR code for text data as an `ft.Image` src: a base64 PNG data
+    URI, or SVG markup when `fmt` is "svg". Results are memoized in memory
+    and, when CHAT_QR_CACHE_DIR is set, on disk.
+    """
+    key = (fmt, data)
+    src = _cache.get(key)
+    if src is not None:
+        return src
+
+    directory = _store_dir()
+    path = _store_path(directory, data, fmt) if directory else None
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            src = f.read()
+    else:
+        src = _render_svg(data) if fmt == "svg" else _render_png(data)
+        if path:
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(src)
+            os.replace(tmp_path, path)
+
+    _cache.set(key, src)
+    return src
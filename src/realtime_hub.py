@@ -0,0 +1,236 @@
+import asyncio
+import inspect
+import itertools
+import random
+import threading
+
+from metrics import timed
+
+
+def _run(result, loop=None):
+    """
+    Schedules the coroutines returned by the async client's realtime API,
+    on `loop` when called from another thread (e.g. a sync Flet handler).
+    """
+    if not inspect.isawaitable(result):
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        if loop is None:
+            raise
+        asyncio.run_coroutine_threadsafe(result, loop)
+        return
+    asyncio.ensure_future(result)
+
+
+def _later(delay: float, fn, *args):
+    """Runs `fn(*args)` after `delay` seconds, on the event loop if there is one."""
+    try:
+        asyncio.get_running_loop().call_later(delay, fn, *args)
+    except RuntimeError:
+        timer = threading.Timer(delay, fn, args)
+        timer.daemon = True
+        timer.start()
+
+
+class RealtimeHub:
+    """
+    Process-wide fan-out for new rows in `public.messages`.
+
+    The hub opens a single channel per signed-in user, filtered on the
+    server to rows where that user is the sender or the receiver, on the
+    realtime connection of one of that user's own sessions, so RLS sees
+    that user's token. If that session leaves while others remain, the
+    channel moves to one of theirs. Each event is routed only to the Flet
+    sessions registered for its (sender_id, receiver_id) key, so sessions
+    no longer receive, or even deserialize, traffic for other users.
+
+    A channel that errors, times out or closes is reopened with exponential
+    backoff. Once it is subscribed again, each listener's `on_resync` is
+    called with the last (created_at, id) delivered to that user, so the
+    session can fetch just the messages sent during the outage.
+    """
+
+    def __init__(self, backoff_base: float = 1.0, backoff_max: float = 30.0):
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Re-entrant: a channel may report its status from inside subscribe().
+        self._lock = threading.RLock()
+        self._client = None    # pinned client (see use_client); otherwise each user's own
+        self._loop = None
+        self._tokens = itertools.count(1)
+        self._topics = itertools.count(1)
+        self._clients = {}     # token -> the subscribing session's Supabase client
+        self._channels = {}    # user_id -> realtime channel
+        self._channel_clients = {}  # user_id -> client the channel runs on
+        self._listeners = {}   # user_id -> {(sender_id, receiver_id) or None: {token: callback}}
+        self._owners = {}      # token -> (user_id, keys)
+        self._resync = {}      # token -> on_resync callback
+        self._last_seen = {}   # user_id -> (created_at, id) of the newest delivered message
+        self._attempts = {}    # user_id -> failed reconnects since the last success
+
+    def use_client(self, client):
+        """Pins one client for every channel, e.g. a worker's broker client or a service connection."""
+        with self._lock:
+            self._client = client
+
+    def use_loop(self, loop):
+        """The event loop realtime calls are scheduled on when made from other threads."""
+        self._loop = loop
+
+    def subscribe(self, supabase, user_id: str, peer_id, callback, on_resync=None) -> int:
+        """
+        Calls `callback(row)` for every message inserted between `user_id`
+        and `peer_id`, or for every message sent or received by `user_id`
+        when `peer_id` is None. `supabase` is the subscribing session's
+        client. `on_resync(since)` is called after the channel recovers
+        from a drop. Returns a token for `unsubscribe`.
+        """
+        keys = {None} if peer_id is None else {(user_id, peer_id), (peer_id, user_id)}
+        with self._lock:
+            token = next(self._tokens)
+            self._clients[token] = supabase
+            routes = self._listeners.setdefault(user_id, {})
+            for key in keys:
+                routes.setdefault(key, {})[token] = callback
+            self._owners[token] = (user_id, keys)
+            if on_resync is not None:
+                self._resync[token] = on_resync
+            if user_id not in self._channels:
+                self._open_channel(user_id)
+        return token
+
+    def unsubscribe(self, token: int):
+        """Drops a listener; the user's channel closes with its last listener."""
+        channel = client = None
+        with self._lock:
+            owner = self._owners.pop(token, None)
+            self._resync.pop(token, None)
+            leaving = self._clients.pop(token, None)
+            if owner is None:
+                return
+            user_id, keys = owner
+            routes = self._listeners.get(user_id, {})
+            for key in keys:
+                callbacks = routes.get(key)
+                if callbacks is not None:
+                    callbacks.pop(token, None)
+                    if not callbacks:
+                        del routes[key]
+            if not routes:
+                self._listeners.pop(user_id, None)
+                self._last_seen.pop(user_id, None)
+                self._attempts.pop(user_id, None)
+                channel = self._channels.pop(user_id, None)
+                client = self._channel_clients.pop(user_id, None)
+            elif (self._client is None and self._channel_clients.get(user_id) is leaving
+                  and leaving not in self._user_clients(user_id)):
+                # The channel runs on the leaving session's client, which may be
+                # signing out: reopen on another session's and resync the gap.
+                channel = self._channels.pop(user_id, None)
+                client = self._channel_clients.pop(user_id, None)
+                self._attempts.setdefault(user_id, 0)
+                self._open_channel(user_id)
+        if channel is not None:
+            self._remove(channel, client)
+
+    # --- Internal helpers ---
+
+    def _user_clients(self, user_id: str) -> list:
+        """Clients of the sessions still listening for `user_id`, oldest first."""
+        return [self._clients[token] for token, (owner, _) in self._owners.items() if owner == user_id]
+
+    def _open_channel(self, user_id: str):
+        client = self._client or self._user_clients(user_id)[0]
+        # A fresh topic per open: the realtime client drops channels by topic,
+        # so a reopened channel must not share one with the channel it replaces.
+        channel = client.realtime.channel(f"messages:{user_id}:{next(self._topics)}")
+        for column in ("receiver_id", "sender_id"):
+            channel.on_postgres_changes(
+                "INSERT",
+                schema="public",
+                table="messages",
+                filter=f"{column}=eq.{user_id}",
+                callback=lambda payload, column=column: self._dispatch(user_id, column, payload),
+            )
+        self._channels[user_id] = channel
+        self._channel_clients[user_id] = client
+        _run(channel.subscribe(lambda status, err=None: self._on_status(user_id, channel, status, err)), self._loop)
+
+    def _remove(self, channel, client):
+        try:
+            _run(client.realtime.remove_channel(channel), self._loop)
+        except Exception as e:
+            print(f"Error removing realtime channel: {e}")
+
+    def _on_status(self, user_id: str, channel, status, err):
+        with self._lock:
+            if self._channels.get(user_id) is not channel:
+                return  # Unsubscribed, or already replaced by a reconnect.
+            status = getattr(status, "value", status)
+            client = self._channel_clients.get(user_id)
+            if status == "SUBSCRIBED":
+                recovered = self._attempts.pop(user_id, None) is not None
+                since = self._last_seen.get(user_id)
+                callbacks = [
+                    self._resync[token]
+                    for token, (owner, _) in self._owners.items()
+                    if owner == user_id and token in self._resync
+                ]
+            elif status in ("CHANNEL_ERROR", "TIMED_OUT", "CLOSED"):
+                attempt = self._attempts.get(user_id, 0)
+                self._attempts[user_id] = attempt + 1
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                recovered = False
+            else:
+                return
+
+        if status != "SUBSCRIBED":
+            print(f"Realtime channel for {user_id[:8]} {status} ({err}); reconnecting in {delay:.1f}s")
+            self._remove(channel, client)
+            # Jitter keeps every session from reconnecting in the same instant.
+            _later(delay * random.uniform(0.5, 1.0), self._reopen, user_id, channel)
+            return
+        if recovered:
+            for on_resync in callbacks:
+                try:
+                    on_resync(since)
+                except Exception as e:
+                    print(f"Error in realtime resync: {e}")
+
+    def _reopen(self, user_id: str, failed):
+        with self._lock:
+            if self._channels.get(user_id) is not failed:
+                return
+            try:
+                self._open_channel(user_id)
+            except Exception as e:
+                print(f"Error reopening realtime channel: {e}")
+                attempt = self._attempts.get(user_id, 0)
+                self._attempts[user_id] = attempt + 1
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                _later(delay, self._reopen, user_id, self._channels.get(user_id))
+
+    def _dispatch(self, user_id: str, column: str, payload):
+        new_msg = payload["data"]["record"]
+        # A message to yourself matches both filters; deliver it once.
+        if column == "sender_id" and new_msg["receiver_id"] == user_id:
+            return
+        key = (new_msg["sender_id"], new_msg["receiver_id"])
+        position = (new_msg["created_at"], new_msg["id"])
+        with self._lock:
+            last = self._last_seen.get(user_id)
+            if last is None or position > last:
+                self._last_seen[user_id] = position
+            routes = self._listeners.get(user_id, {})
+            callbacks = list(routes.get(key, {}).values()) + list(routes.get(None, {}).values())
+        with timed("realtime.dispatch"):
+            for callback in callbacks:
+                try:
+                    callback(new_msg)
+                except Exception as e:
+                    print(f"Error in realtime listener: {e}")
+
+
+hub = RealtimeHub()
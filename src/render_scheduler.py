@@ -0,0 +1,199 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from metrics import registry, timed
+
+FRAME_INTERVAL = 1 / 30
+
+_totals_lock = threading.Lock()
+_totals = {"requested": 0, "flushed": 0}
+
+
+def _count(name: str):
+    with _totals_lock:
+        _totals[name] += 1
+
+
+def totals() -> dict:
+    """Process-wide page updates requested vs. actually sent."""
+    with _totals_lock:
+        return dict(_totals)
+
+
+registry.add_collector(lambda: {f"page_updates_{name}_total": value for name, value in totals().items()})
+
+
+class RenderScheduler:
+    """
+    Coalesces page updates for one page.
+
+    Handlers call `request()` (optionally with the controls that changed)
+    instead of `page.update()`. The first request after an idle frame is
+    flushed right away so single interactions keep their latency; any
+    further requests within `interval` are merged into one trailing flush.
+    Flushes run on the page's event loop, like Flet's own handlers: a
+    request from another thread (a sync handler, a broker reader) always
+    hands its flush to the loop rather than updating the page itself, and
+    only one flush runs at a time.
+    """
+
+    def __init__(self, page, interval: float = FRAME_INTERVAL):
+        self.page = page
+        self.interval = interval
+        self.requested = 0
+        self.flushed = 0
+        self._lock = threading.Lock()
+        # Reentrant: hooks may request (and so flush) again from within a flush.
+        self._flush_lock = threading.RLock()
+        self._dirty_page = False
+        self._dirty_controls = []
+        self._pending = False
+        self._last_flush = float("-inf")
+        self._before_flush = []
+        self._after_flush = []
+
+    def add_before_flush(self, hook):
+        """Registers a callable run at the start of every flush (e.g. to drain a queue)."""
+        self._before_flush.append(hook)
+
+    def remove_before_flush(self, hook):
+        if hook in self._before_flush:
+            self._before_flush.remove(hook)
+
+    def add_after_flush(self, hook):
+        """Registers a callable run after every update sent (e.g. to scroll to new content)."""
+        self._after_flush.append(hook)
+
+    def remove_after_flush(self, hook):
+        if hook in self._after_flush:
+            self._after_flush.remove(hook)
+
+    def request(self, *controls):
+        """Marks the page (or just `controls`) dirty and schedules a flush."""
+        _count("requested")
+        with self._lock:
+            self.requested += 1
+            if controls:
+                self._dirty_controls.extend(c for c in controls if c not in self._dirty_controls)
+            else:
+                self._dirty_page = True
+            if self._pending:
+                return
+            delay = self._last_flush + self.interval - time.monotonic()
+            loop = self.page.loop
+            if loop is not None and not loop.is_closed():
+                if not _running_on(loop):
+                    self._pending = True
+                    if delay > 0:
+                        # Thread-safe hop onto the loop; call_later itself is not.
+                        loop.call_soon_threadsafe(loop.call_later, delay, self.flush)
+                    else:
+                        loop.call_soon_threadsafe(self.flush)
+                    return
+                if delay > 0:
+                    self._pending = True
+                    loop.call_later(delay, self.flush)
+                    return
+        self.flush()
+
+    def flush(self):
+        """Runs the before-flush hooks and sends at most one update."""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            self._pending = False
+        for hook in list(self._before_flush):
+            try:
+                hook()
+            except Exception as e:
+                print(f"Error in render hook: {e}")
+
+        with self._lock:
+            dirty_page, controls = self._dirty_page, self._dirty_controls
+            self._dirty_page, self._dirty_controls = False, []
+            if not dirty_page and not controls:
+                return
+            self._last_flush = time.monotonic()
+            self.flushed += 1
+        _count("flushed")
+
+        try:
+            with timed("page.update"):
+                if dirty_page:
+                    self.page.update()
+                else:
+                    mounted = [c for c in controls if c.page is not None]
+                    if mounted:
+                        self.page.update(*mounted)
+        except Exception as e:
+            # The session may have gone away between request and flush.
+            print(f"Error updating page: {e}")
+            return
+        for hook in list(self._after_flush):
+            try:
+                hook()
+            except Exception as e:
+                print(f"Error in render hook: {e}")
+
+    def metrics(self) -> dict:
+        return {"requested": self.requested, "flushed": self.flushed}
+
+
+def _running_on(loop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def scheduler_for(page) -> RenderScheduler:
+    """The page's scheduler, created on first use and kept in the session."""
+    scheduler = page.session.get("render_scheduler")
+    if scheduler is None:
+        scheduler = RenderScheduler(page)
+        page.session.set("render_scheduler", scheduler)
+    return scheduler
+
+
+def schedule_update(page, *controls):
+    """Drop-in replacement for `page.update()` that coalesces bursts."""
+    scheduler_for(page).request(*controls)
+
+
+class EventQueue:
+    """
+    Bounded buffer between realtime callbacks and the renderer.
+
+    Producers `put` events from any thread; the page drains them in one
+    batch per flush. When full, new events are dropped and `overflowed` is
+    set so the consumer can resynchronize from the server instead.
+    """
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.overflowed = False
+        self._items = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item) -> bool:
+        with self._lock:
+            if len(self._items) >= self.maxsize:
+                self.dropped += 1
+                self.overflowed = True
+                return False
+            self._items.append(item)
+            return True
+
+    def drain(self) -> list:
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+        return items
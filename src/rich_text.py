@@ -0,0 +1,98 @@
+import hashlib
+import os
+import re
+
+from ttl_cache import TTLCache
+
+# Anything that could be Markdown: emphasis, code, headings, quotes, links,
+# tables, list items and URLs. Messages with none of it are plain text.
+_MARKUP = re.compile(r"[*_`#>~\[|]|^[ \t]*(?:[-+]|\d+[.)])[ \t]|://|www\.", re.M)
+_FENCE = re.compile(r"^(```|~~~)[^\n]*\n.*?^\1[ \t]*$", re.M | re.S)
+_BLOCK = re.compile(r"^[ \t]*(?:#{1,6}[ \t]|>|(?:[-+*]|\d+[.)])[ \t]|```|~~~|\|)", re.M)
+_LINK = re.compile(r"(!?)\[([^\]\n]*)\]\(\s*<?((?:[^()\s<>]|\([^()\s]*\))*)>?(?:\s+\"[^\"\n]*\")?\s*\)")
+# Reference definitions ("[label]: target"), autolinks ("<scheme:...>") and
+# reference images ("![alt][label]", "![label]").
+_REFERENCE = re.compile(r"^ {0,3}\[(?:[^\]\\\n]|\\.)+\]:[ \t]*\n?[ \t]*<?([^\s>]*)>?[^\n]*$", re.M)
+_AUTOLINK = re.compile(r"<([A-Za-z][A-Za-z0-9+.\-]{1,31}:[^\s<>]*)>")
+_REFERENCE_IMAGE = re.compile(r"!(?=\[)")
+_SAFE_SCHEMES = ("http://", "https://", "mailto:")
+
+MARKDOWN_CACHE_SIZE = int(os.environ.get("CHAT_MARKDOWN_CACHE_SIZE") or 2048)
+
+
+class MarkdownBody:
+    """
+    A message body prepared for `ft.Markdown`: links, reference definitions
+    and autolinks are limited to safe schemes and images shown as links. `block` is set when the body has
+    block-level content (several lines, lists, code...) and so belongs on
+    its own line below the sender's name.
+    """
+
+    __slots__ = ("markdown", "block")
+
+    def __init__(self, markdown: str, block: bool):
+        self.markdown = markdown
+        self.block = block
+
+
+def looks_plain(content: str) -> bool:
+    """True when `content` has no Markdown syntax, so it renders as plain text."""
+    return _MARKUP.search(content) is None
+
+
+def is_safe_link(url: str) -> bool:
+    """True for the link schemes messages may open: http, https and mailto."""
+    return bool(url) and url.lower().startswith(_SAFE_SCHEMES)
+
+
+def _safe_link(match) -> str:
+    _, text, target = match.groups()
+    if is_safe_link(target):
+        # Remote images would load on every client that renders the message.
+        return f"[{text or target}]({target})"
+    return text
+
+
+def _sanitize(text: str) -> str:
+    text = _REFERENCE.sub(lambda m: m.group() if is_safe_link(m.group(1)) else "", text)
+    text = _LINK.sub(_safe_link, text)
+    text = _AUTOLINK.sub(lambda m: m.group() if is_safe_link(m.group(1)) else m.group(1), text)
+    # Reference images become links to the (already sanitized) definition.
+    return _REFERENCE_IMAGE.sub("", text)
+
+
+def parse(content: str) -> MarkdownBody:
+    """Prepares a message for rendering as Markdown; code blocks are left verbatim."""
+    parts, position = [], 0
+    for fence in _FENCE.finditer(content):
+        parts.append(_sanitize(content[position:fence.start()]))
+        parts.append(fence.group())
+        position = fence.end()
+    parts.append(_sanitize(content[position:]))
+    markdown = "".join(parts)
+    return MarkdownBody(markdown, "\n" in markdown.strip() or _BLOCK.search(markdown) is not None)
+
+
+def markdown_cache() -> TTLCache:
+    """A session's prepared bodies by content hash (LRU, CHAT_MARKDOWN_CACHE_SIZE entries)."""
+    return TTLCache(maxsize=MARKDOWN_CACHE_SIZE)
+
+
+def markdown_body(content: str, cache: TTLCache = None):
+    """
+    The prepared Markdown for a message, or None if it is plain text.
+    Plain text is recognized with one regex scan, never parsed, and
+    rendered as a plain `ft.Text`. With a `cache` (see markdown_cache),
+    a body is parsed once and reused by every later rebuild of the list
+    or of search results.
+    """
+    if looks_plain(content):
+        return None
+    if cache is None:
+        return parse(content)
+    key = hashlib.blake2b(content.encode(), digest_size=16).digest()
+    body = cache.get(key)
+    if body is None:
+        body = parse(content)
+        cache.set(key, body)
+    return body
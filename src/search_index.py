@@ -0,0 +1,144 @@
+import bisect
+import heapq
+import os
+import re
+import threading
+
+from message_store import Message
+
+_TOKEN = re.compile(r"\w+")
+# A last term that prefixes more tokens than this is matched by scanning
+# candidates instead of merging every matching posting list.
+MAX_PREFIX_TOKENS = 64
+# Messages kept per index. Each costs roughly 0.5-1 KB (the message plus its
+# postings), so the default holds a conversation's index to about 4 MB.
+DEFAULT_CAPACITY = int(os.environ.get("CHAT_SEARCH_INDEX_SIZE") or 5000)
+
+
+def tokenize(text: str) -> list:
+    """Lower-cased word tokens of `text`."""
+    return _TOKEN.findall(text.casefold())
+
+
+class SearchIndex:
+    """
+    Incrementally maintained inverted index over one conversation.
+
+    Maps each token to the ids of the messages containing it, so a query
+    costs a few set intersections instead of a scan. Every query term must
+    match; the last one also matches as a prefix, so results follow the
+    user's typing. Broad queries walk back from the newest message until
+    enough matches are found instead of ranking every hit.
+    Only the newest `capacity` messages are kept; older ones are evicted
+    and `truncated` is set. `oldest` is the position of the oldest indexed
+    message: anything older has to be searched on the server.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.truncated = False
+        self.oldest = None
+        self._postings = {}     # token -> {message id}
+        self._vocabulary = []   # sorted tokens, for prefix lookups
+        self._messages = {}     # message id -> Message
+        self._keys = []         # sorted (created_at, id), parallel to _order
+        self._order = []        # messages, oldest first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __contains__(self, message_id):
+        return message_id in self._messages
+
+    def add(self, rows):
+        """Indexes new messages; known ids only have their position refreshed."""
+        with self._lock:
+            for row in rows:
+                message = Message.from_row(row)
+                previous = self._messages.get(message.id)
+                self._messages[message.id] = message
+                if previous is not None:
+                    self._unplace(previous)
+                self._place(message)
+                if self.oldest is None or message.cursor < self.oldest:
+                    self.oldest = message.cursor
+                if previous is not None:
+                    continue
+                for token in set(tokenize(message.content)):
+                    ids = self._postings.get(token)
+                    if ids is None:
+                        ids = self._postings[token] = set()
+                        bisect.insort(self._vocabulary, token)
+                    ids.add(message.id)
+            self._evict()
+
+    def search(self, query: str, limit: int = 50) -> list:
+        """Up to `limit` messages matching every term of `query`, newest first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        prefix = terms[-1]
+        with self._lock:
+            exact = sorted((self._postings.get(term, set()) for term in terms[:-1]), key=len)
+            start = bisect.bisect_left(self._vocabulary, prefix)
+            end = bisect.bisect_left(self._vocabulary, prefix + "\U0010ffff", start)
+
+            tokens = self._vocabulary[start:end]
+            check_prefix = len(tokens) > MAX_PREFIX_TOKENS
+            if not check_prefix:
+                if len(tokens) == 1:
+                    exact.append(self._postings[tokens[0]])
+                else:
+                    exact.append(set().union(*map(self._postings.get, tokens)))
+                exact.sort(key=len)
+
+            hits = exact[0].intersection(*exact[1:]) if exact else None
+            if hits is not None and len(hits) <= limit * 20:
+                # Few hits: rank them directly.
+                found = [
+                    message for message in map(self._messages.get, hits)
+                    if not check_prefix or _has_prefix(message, prefix)
+                ]
+            else:
+                # Many hits: walk back from the newest message until enough match.
+                found = []
+                for message in reversed(self._order):
+                    if (hits is None or message.id in hits) and (not check_prefix or _has_prefix(message, prefix)):
+                        found.append(message)
+                        if len(found) == limit:
+                            break
+        return heapq.nlargest(limit, found, key=lambda message: message.cursor)
+
+    def _place(self, message):
+        index = bisect.bisect_left(self._keys, message.cursor)
+        self._keys.insert(index, message.cursor)
+        self._order.insert(index, message)
+
+    def _evict(self):
+        """Drops the oldest messages past `capacity`, with their postings."""
+        overflow = len(self._order) - self.capacity
+        if overflow <= 0:
+            return
+        for message in self._order[:overflow]:
+            del self._messages[message.id]
+            for token in set(tokenize(message.content)):
+                ids = self._postings[token]
+                ids.discard(message.id)
+                if not ids:
+                    del self._postings[token]
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+        del self._order[:overflow]
+        del self._keys[:overflow]
+        self.oldest = self._keys[0]
+        self.truncated = True
+
+    def _unplace(self, message):
+        index = bisect.bisect_left(self._keys, message.cursor)
+        if index < len(self._order) and self._order[index].id == message.id:
+            del self._keys[index]
+            del self._order[index]
+
+
+def _has_prefix(message, prefix: str) -> bool:
+    return any(token.startswith(prefix) for token in tokenize(message.content))
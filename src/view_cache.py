@@ -0,0 +1,43 @@
+class ViewCache:
+    """
+    Keeps constructed views alive for one session.
+
+    A view is stored per route together with the key it was built for
+    (e.g. the user id) and a `dispose` callback that releases what it
+    holds (realtime listeners, render hooks). A cached view is only
+    returned for the same key; storing a new one or `invalidate` (on
+    logout and when the session closes) disposes the old.
+    """
+
+    def __init__(self):
+        self._views = {}  # route -> (key, view, dispose)
+
+    def get(self, route: str, key=None):
+        entry = self._views.get(route)
+        if entry is None or entry[0] != key:
+            return None
+        return entry[1]
+
+    def put(self, route: str, key, view, dispose=None):
+        self.invalidate(route)
+        self._views[route] = (key, view, dispose)
+
+    def invalidate(self, route: str = None):
+        """Disposes the view cached for `route`, or every view if no route is given."""
+        routes = [route] if route is not None else list(self._views)
+        for name in routes:
+            entry = self._views.pop(name, None)
+            if entry is not None and entry[2] is not None:
+                try:
+                    entry[2]()
+                except Exception as e:
+                    print(f"Error disposing view {name}: {e}")
+
+
+def view_cache_for(page) -> ViewCache:
+    """The page's view cache, created on first use and kept in the session."""
+    cache = page.session.get("view_cache")
+    if cache is None:
+        cache = ViewCache()
+        page.session.set("view_cache", cache)
+    return cache
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from attachments import discard_upload, safe_name, thumbnail_path, upload_path
+
+
+@pytest.fixture(autouse=True)
+def upload_root(tmp_path, monkeypatch):
+    root = tmp_path / "uploads"
+    root.mkdir()
+    monkeypatch.setenv("CHAT_UPLOAD_DIR", str(root))
+    return root
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("photo.jpg", "photo.jpg"),
+    ("../../etc/passwd", "passwd"),
+    ("..\\..\\windows\\system.ini", "system.ini"),
+    ("C:\\Users\\me\\photo.jpg", "photo.jpg"),
+    ("/abs/path/report.pdf", "report.pdf"),
+    ("..", "file"),
+    ("dir/..", "file"),
+    ("", "file"),
+    (None, "file"),
+    ("  ", "file"),
+])
+def test_safe_name_keeps_only_the_last_component(name, expected):
+    assert safe_name(name) == expected
+
+
+def test_upload_path_resolves_inside_upload_dir(upload_root):
+    assert upload_path("abc/photo.jpg") == os.path.join(os.path.realpath(upload_root), "abc", "photo.jpg")
+
+
+@pytest.mark.parametrize("relative", ["../outside.txt", "abc/../../outside.txt", "/etc/passwd", "", "."])
+def test_upload_path_rejects_paths_outside_upload_dir(relative):
+    with pytest.raises(ValueError):
+        upload_path(relative)
+
+
+def test_upload_path_rejects_symlinks_out_of_upload_dir(upload_root, tmp_path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (upload_root / "link").symlink_to(outside)
+    with pytest.raises(ValueError):
+        upload_path("link/secret.txt")
+
+
+def test_discard_upload_removes_the_upload_folder(upload_root):
+    folder = upload_root / "abc"
+    folder.mkdir()
+    (folder / "photo.jpg").write_bytes(b"data")
+    discard_upload(str(folder / "photo.jpg"))
+    assert not folder.exists()
+    assert upload_root.exists()
+
+
+@pytest.mark.parametrize("path", ["photo.jpg", "abc/def/photo.jpg", "../outside/photo.jpg"])
+def test_discard_upload_refuses_anything_but_an_upload_folder(upload_root, tmp_path, path):
+    (tmp_path / "outside").mkdir()
+    (upload_root / "abc" / "def").mkdir(parents=True)
+    with pytest.raises(ValueError):
+        discard_upload(str(upload_root / path))
+    assert upload_root.exists()
+    assert (upload_root / "abc" / "def").exists()
+    assert (tmp_path / "outside").exists()
+
+
+def test_thumbnail_path_accepts_the_senders_own_folder():
+    attachment = {"thumbnail": "sender-1/thumbnails/abc.jpg"}
+    assert thumbnail_path(attachment, "sender-1") == "sender-1/thumbnails/abc.jpg"
+
+
+@pytest.mark.parametrize("thumbnail", [
+    "other-user/thumbnails/abc.jpg",
+    "sender-10/thumbnails/abc.jpg",
+    "sender-1",
+    "sender-1/../other-user/thumbnails/abc.jpg",
+    "sender-1/./thumbnails/abc.jpg",
+    "sender-1//thumbnails/abc.jpg",
+    "sender-1/..\\other-user\\abc.jpg",
+    "",
+    None,
+])
+def test_thumbnail_path_rejects_other_users_folders(thumbnail):
+    assert thumbnail_path({"thumbnail": thumbnail}, "sender-1") is None
+    assert thumbnail_path({}, "sender-1") is None
@@ -0,0 +1,99 @@
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+
+from identity import InvalidToken, decode_token
+
+NOW = 1_700_000_000
+SECRET = "a-project-jwt-secret-of-32-bytes+"
+
+
+def _segment(data) -> str:
+    raw = data if isinstance(data, bytes) else json.dumps(data).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def make_token(claims: dict, secret: str = None, alg: str = "HS256", digest=hashlib.sha256) -> str:
+    signing_input = f"{_segment({'alg': alg, 'typ': 'JWT'})}.{_segment(claims)}"
+    signature = b""
+    if secret is not None:
+        signature = hmac.new(secret.encode(), signing_input.encode(), digest).digest()
+    return f"{signing_input}.{_segment(signature)}"
+
+
+@pytest.fixture(autouse=True)
+def no_secret(monkeypatch):
+    monkeypatch.delenv("SUPABASE_JWT_SECRET", raising=False)
+
+
+def test_valid_token_returns_claims():
+    claims = {"sub": "user-1", "email": "me@example.com", "exp": NOW + 3600}
+    assert decode_token(make_token(claims), now=NOW) == claims
+
+
+def test_signed_token_is_verified():
+    token = make_token({"sub": "user-1", "exp": NOW + 3600}, secret=SECRET)
+    assert decode_token(token, secret=SECRET, now=NOW)["sub"] == "user-1"
+    with pytest.raises(InvalidToken, match="signature"):
+        decode_token(token, secret=SECRET[::-1], now=NOW)
+    with pytest.raises(InvalidToken, match="signature"):
+        decode_token(make_token({"sub": "user-1", "exp": NOW + 3600}), secret=SECRET, now=NOW)
+
+
+def test_secret_is_read_from_the_environment(monkeypatch):
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", SECRET)
+    with pytest.raises(InvalidToken, match="signature"):
+        decode_token(make_token({"sub": "user-1", "exp": NOW + 3600}), now=NOW)
+
+
+@pytest.mark.parametrize("alg, secret, digest", [
+    ("none", None, None),
+    ("None", None, None),
+    ("HS512", SECRET, hashlib.sha512),
+    ("HS384", SECRET, hashlib.sha384),
+    ("RS256", SECRET, hashlib.sha256),
+])
+def test_only_hs256_is_accepted_with_a_secret(alg, secret, digest):
+    token = make_token({"sub": "user-1", "exp": NOW + 3600}, secret=secret, alg=alg, digest=digest)
+    with pytest.raises(InvalidToken, match="algorithm"):
+        decode_token(token, secret=SECRET, now=NOW)
+
+
+def test_expired_token():
+    token = make_token({"sub": "user-1", "exp": NOW - 31})
+    with pytest.raises(InvalidToken, match="expired"):
+        decode_token(token, now=NOW)
+
+
+def test_expiry_leeway():
+    token = make_token({"sub": "user-1", "exp": NOW - 10})
+    assert decode_token(token, now=NOW)["sub"] == "user-1"
+    with pytest.raises(InvalidToken, match="expired"):
+        decode_token(token, leeway=0, now=NOW)
+
+
+@pytest.mark.parametrize("token", [
+    None,
+    "",
+    "not-a-jwt",
+    "a.b",
+    "a.b.c.d",
+    f"{_segment({'alg': 'HS256'})}.not-base64-json.",
+    f"{_segment(b'not json')}.{_segment({'sub': 'user-1', 'exp': NOW})}.",
+])
+def test_malformed_token(token):
+    with pytest.raises(InvalidToken, match="Malformed"):
+        decode_token(token, now=NOW)
+
+
+@pytest.mark.parametrize("claims", [
+    {"exp": NOW + 3600},
+    {"sub": "user-1"},
+    {},
+])
+def test_missing_claims(claims):
+    with pytest.raises(InvalidToken, match="missing"):
+        decode_token(make_token(claims), now=NOW)
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from render_scheduler import RenderScheduler
+
+
+class StubPage:
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.update_threads = []
+        self.active = 0
+        self.overlapped = False
+        self._lock = threading.Lock()
+
+    def update(self, *controls):
+        with self._lock:
+            self.active += 1
+            self.overlapped |= self.active > 1
+        self.update_threads.append(threading.current_thread())
+        with self._lock:
+            self.active -= 1
+
+
+def test_request_without_loop_flushes_inline():
+    page = StubPage()
+    scheduler = RenderScheduler(page)
+    scheduler.request()
+    assert page.update_threads == [threading.current_thread()]
+
+
+def test_request_on_loop_flushes_inline_then_coalesces():
+    async def run():
+        page = StubPage(asyncio.get_running_loop())
+        scheduler = RenderScheduler(page, interval=0.05)
+        scheduler.request()
+        scheduler.request()
+        scheduler.request()
+        assert len(page.update_threads) == 1
+        await asyncio.sleep(0.1)
+        return page
+
+    page = asyncio.run(run())
+    assert len(page.update_threads) == 2
+
+
+def test_requests_from_other_threads_flush_on_the_loop():
+    async def run():
+        loop = asyncio.get_running_loop()
+        page = StubPage(loop)
+        scheduler = RenderScheduler(page, interval=0)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            await asyncio.gather(*(loop.run_in_executor(pool, scheduler.request) for _ in range(200)))
+        await asyncio.sleep(0.05)
+        return page
+
+    page = asyncio.run(run())
+    assert page.update_threads
+    assert set(page.update_threads) == {threading.main_thread()}
+    assert not page.overlapped
@@ -0,0 +1,98 @@
+import pytest
+
+from rich_text import is_safe_link, markdown_body, markdown_cache, parse
+
+
+@pytest.mark.parametrize("url", ["http://example.com", "https://example.com", "HTTPS://EXAMPLE.COM", "mailto:me@example.com"])
+def test_safe_schemes(url):
+    assert is_safe_link(url)
+
+
+@pytest.mark.parametrize("url", [
+    "javascript:alert(1)",
+    "JavaScript:alert(1)",
+    "data:text/html,<script>alert(1)</script>",
+    "file:///etc/passwd",
+    "vbscript:msgbox",
+    " https://example.com",
+    "//example.com",
+    "",
+    None,
+])
+def test_unsafe_schemes(url):
+    assert not is_safe_link(url)
+
+
+@pytest.mark.parametrize("content, expected", [
+    ("[click](javascript:alert(1))", "click"),
+    ("[click](JAVASCRIPT:alert(1))", "click"),
+    ("[click]( javascript:alert(1) )", "click"),
+    ("[click](<javascript:alert(1)>)", "click"),
+    ("[click](data:text/html,hi \"title\")", "click"),
+    ("[ok](https://example.com)", "[ok](https://example.com)"),
+    ("[](https://example.com)", "[https://example.com](https://example.com)"),
+])
+def test_inline_links_keep_only_safe_targets(content, expected):
+    assert parse(content).markdown == expected
+
+
+def test_images_become_links():
+    assert parse("![cat](https://example.com/cat.png)").markdown == "[cat](https://example.com/cat.png)"
+    assert parse("![cat](javascript:alert(1))").markdown == "cat"
+
+
+@pytest.mark.parametrize("definition", [
+    "[x]: javascript:alert(1)",
+    "[x]: <javascript:alert(1)>",
+    "   [x]: data:text/html,hi \"title\"",
+    "[x]:\n  javascript:alert(1)",
+])
+def test_unsafe_reference_definitions_are_removed(definition):
+    markdown = parse(f"see [x]\n\n{definition}").markdown
+    assert "javascript" not in markdown
+    assert "data:" not in markdown
+    assert markdown.startswith("see [x]")
+
+
+def test_safe_reference_definitions_are_kept():
+    content = "see [x]\n\n[x]: https://example.com \"Example\""
+    assert parse(content).markdown == content
+
+
+def test_reference_images_become_links():
+    markdown = parse("![alt][ref]\n\n[ref]: https://example.com/i.png").markdown
+    assert markdown == "[alt][ref]\n\n[ref]: https://example.com/i.png"
+
+
+@pytest.mark.parametrize("content, expected", [
+    ("<javascript:alert(1)>", "javascript:alert(1)"),
+    ("<data:text/html,hi>", "data:text/html,hi"),
+    ("<https://example.com>", "<https://example.com>"),
+    ("<mailto:me@example.com>", "<mailto:me@example.com>"),
+])
+def test_autolinks_keep_only_safe_schemes(content, expected):
+    assert parse(content).markdown == expected
+
+
+def test_code_blocks_are_left_verbatim():
+    content = "```\n[a](javascript:alert(1))\n```"
+    assert parse(content).markdown == content
+
+
+def test_block_content_is_flagged():
+    assert parse("- one\n- two").block
+    assert parse("```\ncode\n```").block
+    assert not parse("**bold** text").block
+
+
+def test_plain_text_skips_the_parser():
+    assert markdown_body("see you at noon") is None
+    assert markdown_body("**bold**").markdown == "**bold**"
+
+
+def test_cache_reuses_prepared_bodies():
+    cache = markdown_cache()
+    body = markdown_body("**bold**", cache)
+    assert markdown_body("**bold**", cache) is body
+    assert markdown_body("plain", cache) is None
+    assert len(cache) == 1